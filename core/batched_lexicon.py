@@ -0,0 +1,333 @@
+from __future__ import division
+
+
+import copy
+import numpy as np
+
+import wmmapping
+
+
+"""
+batched_lexicon.py
+
+A Lexicon for a batch of parameter settings (configurations) of the same
+feature space at once, whose gamma, k, p, decay and feature weight
+parameters are arrays, with one value per configuration.
+"""
+
+
+class BatchedLexicon(object):
+    """
+    A BatchedLexicon maps words to meanings, as Lexicon does, for each of a
+    batch of configurations. The meaning probabilities of a word are a
+    (configurations x features) array, computed with a leading configuration
+    axis through the associations, gammas and denominators.
+
+    The alignments of a word to the features of each utterance are stored
+    as a (configurations x features) array, since they depend on the
+    configuration; the alignments that are not positive are not stored, as
+    in Lexicon.
+
+    Members:
+        num_configurations -- the number of configurations
+        feature_group_to_level_map -- a dict of (feature group -> hierarchy
+            level)
+        feature_to_feature_group_map -- a dict of (feature -> feature group)
+    """
+
+    def __init__(
+        self, words,
+        gamma_sup, gamma_basic, gamma_sub, gamma_instance,
+        k_sup, k_basic, k_sub, k_instance,
+        p_sup, p_basic, p_sub, p_instance,
+        decay_sup, decay_basic, decay_sub, decay_instance,
+        feature_weight_sup, feature_weight_basic, feature_weight_sub, feature_weight_instance,
+        feature_group_to_level_map,
+        feature_to_feature_group_map,
+    ):
+        self.feature_group_to_level_map = feature_group_to_level_map
+        self.feature_to_feature_group_map = feature_to_feature_group_map
+
+        # The parameters of each level, as (configurations) arrays
+        level_params = {
+            'superordinate': (gamma_sup, k_sup, p_sup, decay_sup),
+            'basic-level': (gamma_basic, k_basic, p_basic, decay_basic),
+            'subordinate': (gamma_sub, k_sub, p_sub, decay_sub),
+            'instance': (gamma_instance, k_instance, p_instance,
+                         decay_instance),
+        }
+        arrays = np.broadcast_arrays(*[
+            np.atleast_1d(np.asarray(param, dtype=float)) for level in
+            sorted(level_params) for param in level_params[level]])
+        self.num_configurations = len(arrays[0])
+        for i, level in enumerate(sorted(level_params)):
+            level_params[level] = arrays[4 * i:4 * i + 4]
+
+        # Feature and feature group ids
+        self._features = sorted(feature_to_feature_group_map)
+        self._feature_ids = dict((feature, i) for i, feature in
+                                 enumerate(self._features))
+        groups = sorted(set(feature_to_feature_group_map.values()))
+        group_ids = dict((group, j) for j, group in enumerate(groups))
+        self._feature_groups = np.array(
+            [group_ids[feature_to_feature_group_map[feature]] for feature in
+             self._features], dtype=np.int_)
+
+        # The (configurations x feature groups) parameters
+        for group in groups:
+            if feature_group_to_level_map[group] not in level_params:
+                raise NotImplementedError(
+                    "BatchedLexicon has no parameters for the level %s" %
+                    feature_group_to_level_map[group])
+        params = [level_params[feature_group_to_level_map[group]] for group in
+                  groups]
+        self._gammas, self._ks, self._ps, self._decays = [
+            np.array([group_params[i] for group_params in params]).T for i in
+            range(4)]
+
+        # The (feature ids, time, (configurations x features) alignments) of
+        # each utterance of each word; the lists are copied by snapshot, and
+        # their entries are never modified
+        self._events = {}
+        self._seen_features = {}
+
+        # The meaning probabilities of each word, keyed by (decay, time)
+        self._cached_probs = {}
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+        for word in words:
+            self.initialize_new_meaning(word)
+
+    def initialize_new_meaning(self, word):
+        """Add word, with an empty meaning, to this BatchedLexicon."""
+        assert word not in self._events
+        self._events[word] = []
+        self._seen_features[word] = set()
+
+    def _feature_id_array(self, features):
+        try:
+            return np.array([self._feature_ids[feature] for feature in
+                             features], dtype=np.int_)
+        except KeyError:
+            raise wmmapping.UndefinedFeatureError(features)
+
+    def _all_probs(self, word, decay, time):
+        """
+        Return a (configurations x features) array of the meaning
+        probabilities of every feature, given word.
+        """
+        key = (decay, time)
+        cached = self._cached_probs.get(word)
+        if cached is not None and cached[0] == key:
+            self._cache_hits += 1
+            return cached[1]
+        self._cache_misses += 1
+
+        probs = self._all_probs_at_times(word, decay, [time])[0]
+
+        self._cached_probs[word] = (key, probs)
+        return probs
+
+    def _all_probs_at_times(self, word, decay, times):
+        """
+        Return a (times x configurations x features) array of the meaning
+        probabilities of every feature, given word, at each of times.
+        """
+        if word not in self._events:
+            self.initialize_new_meaning(word)
+
+        num_times = len(times)
+        num_configurations = self.num_configurations
+        num_features = len(self._features)
+        num_groups = self._gammas.shape[1]
+
+        events = self._events[word]
+
+        if not events:
+            associations = np.zeros((num_times, num_configurations,
+                                     num_features))
+            counts_per_feature = associations[0]
+
+        else:
+            features = np.concatenate([feature_ids for feature_ids, time,
+                                       alignments in events])
+            times_aligned = np.concatenate(
+                [np.repeat(time, len(feature_ids)) for feature_ids, time,
+                 alignments in events])
+            alignments = np.concatenate([alignments for feature_ids, time,
+                                         alignments in events], axis=1)
+            aligned = alignments > 0
+
+            counts_per_feature = wmmapping.bincount_rows(
+                features, aligned.astype(float), num_features)
+
+            if decay:
+                # Weight each alignment by the proportion of all the
+                # alignments of its feature that occurred at its time, and
+                # decay it
+                keys = features * (times_aligned.max() + 1) + times_aligned
+                unique_keys, inverse = np.unique(keys, return_inverse=True)
+                counts_per_time = wmmapping.bincount_rows(
+                    inverse, aligned.astype(float), len(unique_keys))[
+                        :, inverse]
+
+                decays = self._decays[:, self._feature_groups[features]]
+                with np.errstate(divide='ignore', invalid='ignore',
+                                 over='ignore'):
+                    a = np.where(aligned, alignments * counts_per_time /
+                                 counts_per_feature[:, features], 1.)
+                    decayed = np.where(aligned, a / np.power(
+                        np.asarray(times)[:, np.newaxis, np.newaxis] -
+                        times_aligned + 1, decays / a), 0.)
+
+                associations = wmmapping.bincount_rows(
+                    features, decayed.reshape(-1, len(features)),
+                    num_features).reshape(num_times, num_configurations,
+                                          num_features)
+
+            else:
+                associations = np.tile(wmmapping.bincount_rows(
+                    features, np.where(aligned, alignments, 0.),
+                    num_features), (num_times, 1, 1))
+
+        # gamma * (number of feature types aligned to word)^p, and the
+        # denominator of each feature group, for each configuration
+        num_types = wmmapping.bincount_rows(
+            self._feature_groups,
+            np.asarray(counts_per_feature > 0, dtype=float), num_groups)
+        gammas = self._gammas * np.maximum(num_types, 1) ** self._ps
+        denoms = wmmapping.bincount_rows(
+            self._feature_groups, associations.reshape(-1, num_features),
+            num_groups).reshape(num_times, num_configurations, num_groups) + \
+            self._ks * gammas
+
+        return (associations + gammas[:, self._feature_groups]) / \
+            denoms[..., self._feature_groups]
+
+    def add_seen_features(self, word, features):
+        """
+        Add features to the list of features encountered so far with word.
+        """
+        assert word in self._events
+        self._seen_features[word] = self._seen_features[word] | set(features)
+
+    def cache_statistics(self):
+        """
+        Return the (hits, misses) of the meaning probability cache of this
+        BatchedLexicon.
+        """
+        return self._cache_hits, self._cache_misses
+
+    def gamma(self, word, feature):
+        """
+        Return an array of the gamma of the feature group of feature, given
+        word, for each configuration, at time 0.
+        """
+        group = self._feature_groups[self._feature_id_array([feature])[0]]
+
+        aligned = np.zeros((self.num_configurations, len(self._features)),
+                           dtype=bool)
+        for feature_ids, time, alignments in self._events.get(word, []):
+            aligned[:, feature_ids] |= alignments > 0
+        num_types = aligned[:, self._feature_groups == group].sum(axis=1)
+
+        return self._gammas[:, group] * np.maximum(num_types, 1) ** \
+            self._ps[:, group]
+
+    def k(self, word, feature):
+        """
+        Return an array of the k parameter of the feature group of feature,
+        for each configuration.
+        """
+        return self._ks[:, self._feature_groups[self._feature_ids[feature]]]
+
+    def meaning(self, word):
+        # A Meaning has scalar parameters
+        raise NotImplementedError("BatchedLexicon has no scalar Meaning")
+
+    def novelty(self, word):
+        raise NotImplementedError(
+            "novelty is not supported by a BatchedLexicon")
+
+    def prob(self, word, feature, decay, time):
+        """
+        Return an array of the probabilities of feature being part of the
+        meaning of word, for each configuration.
+        """
+        feature_id = self._feature_id_array([feature])[0]
+        return self._all_probs(word, decay, time)[:, feature_id]
+
+    def probs(self, word, features, decay, time):
+        """
+        Return a (configurations x features) array of the probabilities of
+        each of features being part of the meaning of word.
+        """
+        feature_ids = self._feature_id_array(features)
+        return self._all_probs(word, decay, time)[:, feature_ids]
+
+    def probs_at_times(self, word, features, decay, times):
+        """
+        Return a (times x configurations x features) array of the
+        probabilities of each of features being part of the meaning of word,
+        at each of times.
+        """
+        feature_ids = self._feature_id_array(features)
+        return self._all_probs_at_times(word, decay, times)[..., feature_ids]
+
+    def seen_features(self, word):
+        """Return the set of features encountered so far with word."""
+        return set(self._seen_features.get(word, ()))
+
+    def snapshot(self, words=None):
+        """
+        Return a copy of this BatchedLexicon, which shares its stored
+        alignments with this BatchedLexicon; the alignments are immutable
+        once stored, so that either copy can be updated independently.
+
+        If words is not None, the copy contains only those of words that are
+        in this BatchedLexicon.
+        """
+        if words is None:
+            words = self._events.keys()
+
+        result = copy.copy(self)
+        result._events = dict((word, list(self._events[word])) for word in
+                              words if word in self._events)
+        result._seen_features = dict((word, self._seen_features[word]) for
+                                     word in result._events)
+        result._cached_probs = self._cached_probs.copy()
+
+        return result
+
+    def update_association(self, word, feature, alignment, decay, time):
+        """
+        Update association between word and feature by adding alignment (an
+        array with a value for each configuration) to the current
+        association.
+        """
+        self.update_associations(word, [feature],
+                                 np.asarray(alignment)[..., np.newaxis],
+                                 decay, time)
+
+    def update_associations(self, word, features, alignments, decay, time):
+        """
+        Update the associations between word and each of features by adding
+        the corresponding alignments, a (configurations x features) array.
+        """
+        if word not in self._events:
+            self.initialize_new_meaning(word)
+
+        alignments = np.array(np.broadcast_to(
+            alignments, (self.num_configurations, len(features))),
+            dtype=float)
+        if not (alignments > 0).any():
+            return
+
+        self._events[word].append((self._feature_id_array(features),
+                                   int(time), alignments))
+        self._cached_probs.pop(word, None)
+
+    def words(self):
+        """Return a set of all words in this BatchedLexicon."""
+        return set(self._events.keys())
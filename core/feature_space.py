@@ -0,0 +1,279 @@
+from __future__ import division
+
+
+import hashlib
+import json
+import logging
+import numpy as np
+import os
+
+import symbols
+
+
+"""
+feature_space.py
+
+A compiled, integer-encoded format for the feature spaces of the novel word
+generalization experiments, and a loader that caches each feature space per
+process.
+
+A feature space directory holds three JSON files (stimuli.json,
+feature_group_to_level_map.json and feature_to_feature_group_map.json); its
+compiled form, feature_space.npz, holds the same information as arrays:
+
+    format_version -- the version of the compiled format
+    version -- the version of the feature space (see source_version)
+    features, feature_groups -- the names of the features and the feature
+        groups, indexed by id
+    feature_group_ids -- the feature group id of each feature
+    levels -- the names of the hierarchy levels
+    feature_group_levels, feature_levels -- the level id of each feature
+        group and of each feature
+    scene_sets -- the set ('training set' or 'test set') of each scene
+    scene_conditions, scene_trials -- the condition and the trial (or test
+        object) name of each scene
+    scene_offsets -- the scene features of scene i are
+        scene_features[scene_offsets[i]:scene_offsets[i+1]]
+    scene_features -- the feature ids of all the scenes
+    unseen_object_features -- the feature ids of the unseen object
+"""
+
+
+FORMAT_VERSION = 2
+
+COMPILED_FILE = 'feature_space.npz'
+STIMULI_FILE = 'stimuli.json'
+FEATURE_GROUP_TO_LEVEL_MAP_FILE = 'feature_group_to_level_map.json'
+FEATURE_TO_FEATURE_GROUP_MAP_FILE = 'feature_to_feature_group_map.json'
+
+
+class FeatureSpace(object):
+    """A feature space, with its features and feature groups as ids.
+
+    A FeatureSpace is shared by every Experiment of a process, and must not
+    be modified.
+
+    Members:
+        version -- the version of the feature space, a hash of its JSON files
+        feature_group_to_level_map -- a dict of (feature group id ->
+            hierarchy level)
+        feature_to_feature_group_map -- a dict of (feature id -> feature group
+            id)
+        features -- a SymbolTable of the features
+        feature_groups -- a SymbolTable of the feature groups
+        training_sets -- a dict of (training condition -> (trial -> scene))
+        test_sets -- a dict of (test condition -> (test object -> scene))
+        unseen_object_features -- the scene of the unseen object
+    """
+
+    def __init__(self, version, feature_group_to_level_map,
+                 feature_to_feature_group_map, features, feature_groups,
+                 training_sets, test_sets, unseen_object_features):
+        self.version = version
+        self.feature_group_to_level_map = feature_group_to_level_map
+        self.feature_to_feature_group_map = feature_to_feature_group_map
+        self.features = features
+        self.feature_groups = feature_groups
+        self.training_sets = training_sets
+        self.test_sets = test_sets
+        self.unseen_object_features = unseen_object_features
+
+
+def source_version(directory):
+    """
+    Return the version of the feature space in directory, as the SHA-1 hash
+    of the contents of its JSON files.
+    """
+    sha1 = hashlib.sha1()
+    for name in [FEATURE_GROUP_TO_LEVEL_MAP_FILE,
+                 FEATURE_TO_FEATURE_GROUP_MAP_FILE, STIMULI_FILE]:
+        with open(os.path.join(directory, name), 'rb') as f:
+            sha1.update(f.read())
+    return unicode(sha1.hexdigest())
+
+
+def read_json_feature_space(directory):
+    """
+    Return the FeatureSpace of the JSON files in directory, with the
+    features and feature groups interned by symbols.intern_feature_space.
+    """
+    with open(os.path.join(directory, STIMULI_FILE)) as f:
+        stimuli = json.load(f)
+    with open(os.path.join(directory, FEATURE_GROUP_TO_LEVEL_MAP_FILE)) as f:
+        feature_group_to_level_map = json.load(f)
+    with open(os.path.join(directory, FEATURE_TO_FEATURE_GROUP_MAP_FILE)) as f:
+        feature_to_feature_group_map = json.load(f)
+
+    (feature_group_to_level_map, feature_to_feature_group_map, features,
+     feature_groups) = symbols.intern_feature_space(
+         feature_group_to_level_map, feature_to_feature_group_map)
+
+    def intern_scenes(scenes):
+        return dict((condition, dict((trial, features.ids(scene)) for
+                                     trial, scene in trials.items()))
+                    for condition, trials in scenes.items())
+
+    return FeatureSpace(source_version(directory), feature_group_to_level_map,
+                        feature_to_feature_group_map, features,
+                        feature_groups,
+                        intern_scenes(stimuli['training set']),
+                        intern_scenes(stimuli['test set']),
+                        features.ids(stimuli['unseen object features']))
+
+
+def compile_feature_space(directory):
+    """
+    Compile the JSON files of the feature space in directory into
+    directory/feature_space.npz, and return its path.
+    """
+    feature_space = read_json_feature_space(directory)
+
+    features = feature_space.features.symbols(range(len(feature_space.features)))
+    feature_groups = feature_space.feature_groups.symbols(
+        range(len(feature_space.feature_groups)))
+    levels = sorted(set(feature_space.feature_group_to_level_map.values()))
+
+    feature_group_ids = [feature_space.feature_to_feature_group_map[i] for i
+                         in range(len(features))]
+    feature_group_levels = [
+        levels.index(feature_space.feature_group_to_level_map[j]) for j in
+        range(len(feature_groups))]
+
+    # The scenes, in the order of the dicts of the FeatureSpace, so that the
+    # dicts are rebuilt in the same order
+    scene_sets = []
+    scene_conditions = []
+    scene_trials = []
+    scene_offsets = [0]
+    scene_features = []
+    for s, scenes in enumerate([feature_space.training_sets,
+                                feature_space.test_sets]):
+        for condition, trials in scenes.items():
+            for trial, scene in trials.items():
+                scene_sets.append(s)
+                scene_conditions.append(condition)
+                scene_trials.append(trial)
+                scene_features.extend(scene)
+                scene_offsets.append(len(scene_features))
+
+    compiled_path = os.path.join(directory, COMPILED_FILE)
+    with open(compiled_path, 'wb') as f:
+        np.savez(
+            f,
+            format_version=np.array(FORMAT_VERSION),
+            version=np.array(feature_space.version, dtype=np.unicode_),
+            features=np.array(features, dtype=np.unicode_),
+            feature_groups=np.array(feature_groups, dtype=np.unicode_),
+            feature_group_ids=np.array(feature_group_ids, dtype=np.int32),
+            levels=np.array(levels, dtype=np.unicode_),
+            feature_group_levels=np.array(feature_group_levels,
+                                          dtype=np.int32),
+            feature_levels=np.array(feature_group_levels, dtype=np.int32)[
+                np.array(feature_group_ids, dtype=np.int32)],
+            scene_sets=np.array(scene_sets, dtype=np.int32),
+            scene_conditions=np.array(scene_conditions, dtype=np.unicode_),
+            scene_trials=np.array(scene_trials, dtype=np.unicode_),
+            scene_offsets=np.array(scene_offsets, dtype=np.int64),
+            scene_features=np.array(scene_features, dtype=np.int32),
+            unseen_object_features=np.array(
+                feature_space.unseen_object_features, dtype=np.int32),
+        )
+
+    return compiled_path
+
+
+def read_compiled_feature_space(compiled_path):
+    """Return the FeatureSpace compiled into compiled_path."""
+    with np.load(compiled_path, allow_pickle=False) as arrays:
+
+        if int(arrays['format_version']) != FORMAT_VERSION:
+            raise ValueError("unsupported feature space format version %d" %
+                             int(arrays['format_version']))
+
+        features = symbols.SymbolTable(
+            [unicode(feature) for feature in arrays['features']])
+        feature_groups = symbols.SymbolTable(
+            [unicode(feature_group) for feature_group in
+             arrays['feature_groups']])
+        levels = [unicode(level) for level in arrays['levels']]
+
+        feature_group_to_level_map = dict(
+            (j, levels[level]) for j, level in
+            enumerate(arrays['feature_group_levels'].tolist()))
+        feature_to_feature_group_map = dict(
+            enumerate(arrays['feature_group_ids'].tolist()))
+
+        scene_sets = arrays['scene_sets'].tolist()
+        scene_conditions = [unicode(c) for c in arrays['scene_conditions']]
+        scene_trials = [unicode(t) for t in arrays['scene_trials']]
+        scene_offsets = arrays['scene_offsets'].tolist()
+        scene_features = arrays['scene_features'].tolist()
+
+        sets = ({}, {})
+        for i, s in enumerate(scene_sets):
+            trials = sets[s].setdefault(scene_conditions[i], {})
+            trials[scene_trials[i]] = \
+                scene_features[scene_offsets[i]:scene_offsets[i + 1]]
+
+        unseen_object_features = arrays['unseen_object_features'].tolist()
+
+        version = unicode(arrays['version'])
+
+    return FeatureSpace(version, feature_group_to_level_map,
+                        feature_to_feature_group_map, features,
+                        feature_groups, sets[0], sets[1],
+                        unseen_object_features)
+
+
+# The FeatureSpaces loaded by this process, keyed by directory, with the
+# modification times of the compiled and JSON files each was loaded with
+_loaded_feature_spaces = {}
+
+
+def load_feature_space(directory):
+    """
+    Return the FeatureSpace in directory, from its compiled form if it is
+    present and up to date, and from its JSON files otherwise.
+
+    The compiled form is up to date if its version is the version of the
+    JSON files (see source_version), so that an edit of any of the JSON files
+    is noticed; if it is not, the JSON files are read, with a warning. The
+    FeatureSpace is cached, and is reloaded only if a file of directory has
+    changed.
+    """
+    directory = os.path.abspath(directory)
+
+    compiled_path = os.path.join(directory, COMPILED_FILE)
+    json_paths = [os.path.join(directory, name) for name in
+                  [FEATURE_GROUP_TO_LEVEL_MAP_FILE,
+                   FEATURE_TO_FEATURE_GROUP_MAP_FILE, STIMULI_FILE]]
+    has_json = all(os.path.exists(path) for path in json_paths)
+
+    mtimes = tuple(os.path.getmtime(path) if os.path.exists(path) else None
+                   for path in [compiled_path] + json_paths)
+
+    try:
+        loaded_mtimes, feature_space = _loaded_feature_spaces[directory]
+        if loaded_mtimes == mtimes:
+            return feature_space
+    except KeyError:
+        pass
+
+    feature_space = None
+    if os.path.exists(compiled_path):
+        feature_space = read_compiled_feature_space(compiled_path)
+        if has_json and feature_space.version != source_version(directory):
+            logging.warning("The compiled feature space in %s is out of date "
+                            "with its JSON files, which are read instead; "
+                            "recompile it with data/generate_data.py "
+                            "--compile_only",
+                            directory)
+            feature_space = None
+
+    if feature_space is None:
+        logging.debug("Reading the JSON files of the feature space in %s",
+                      directory)
+        feature_space = read_json_feature_space(directory)
+
+    _loaded_feature_spaces[directory] = (mtimes, feature_space)
+    return feature_space
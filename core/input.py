@@ -0,0 +1,195 @@
+from __future__ import division
+
+
+import gzip
+import io
+import logging
+import time
+
+
+"""
+input.py
+
+Streaming readers of word learning corpora.
+
+A corpus file is a sequence of utterances, each given as a pair of lines:
+
+    SENTENCE: word1 word2 ...
+    SEM_REP: ,feature1,feature2,...
+
+Any other line (e.g., an utterance number or separator) is ignored. Corpus
+files whose names end in '.gz' are read as gzip files.
+"""
+
+
+class CorpusFormatError(Exception):
+    """
+    Defines an exception that occurs when a corpus file is not in the
+    expected format.
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return repr(self.value)
+
+
+def open_corpus_file(corpus_path, buffer_size=io.DEFAULT_BUFFER_SIZE):
+    """
+    Return a file object for reading the corpus file at corpus_path, which is
+    decompressed on the fly if corpus_path ends in '.gz'.
+    """
+    if corpus_path.endswith('.gz'):
+        return io.BufferedReader(gzip.open(corpus_path, 'rb'),
+                                 buffer_size=buffer_size)
+    return io.open(corpus_path, 'rb', buffering=buffer_size)
+
+
+def read_lines(corpus_file, chunk_size=1 << 20):
+    """
+    Yield the lines of corpus_file, read in chunks of about chunk_size
+    bytes, so that the memory in use does not grow with the size of the file.
+    """
+    while True:
+        lines = corpus_file.readlines(chunk_size)
+        if not lines:
+            break
+        for line in lines:
+            yield line
+
+
+def read_pairs(lines, interned=None):
+    """
+    Yield the (words, features) pair of each utterance in lines.
+
+    Every word and feature is interned, so that each distinct string is held
+    in memory once however many utterances it occurs in; interned is the
+    dict of the strings interned so far, which is shared if given.
+    """
+    if interned is None:
+        interned = {}
+
+    def intern_all(strings):
+        return [interned.setdefault(s, s) for s in strings]
+
+    words = None
+
+    for line in lines:
+
+        if line.startswith('SENTENCE:'):
+            if words is not None:
+                raise CorpusFormatError("SENTENCE without SEM_REP: " + line)
+            words = intern_all(line.split()[1:])
+
+        elif line.startswith('SEM_REP:'):
+            if words is None:
+                raise CorpusFormatError("SEM_REP without SENTENCE: " + line)
+            features = intern_all(feature for feature in
+                                  line[len('SEM_REP:'):].strip().split(',')
+                                  if feature != '')
+            yield words, features
+            words = None
+
+    if words is not None:
+        raise CorpusFormatError("SENTENCE without SEM_REP at end of corpus")
+
+
+class Corpus(object):
+    """A streaming reader of the (words, features) pairs of a corpus file.
+
+    If word_symbols (feature_symbols) is a SymbolTable, then the words
+    (features) of each pair are given as their ids in it, rather than as
+    strings.
+
+    Members:
+        corpus_path -- the path of the corpus file
+        interned -- a dict of the words and features read so far, each mapped
+            to its single interned copy
+        utterances -- the number of utterances read so far
+        word_symbols -- the SymbolTable of the words, or None
+        feature_symbols -- the SymbolTable of the features, or None
+    """
+
+    def __init__(self, corpus_path, chunk_size=1 << 20, word_symbols=None,
+                 feature_symbols=None):
+        self.corpus_path = corpus_path
+        self.interned = {}
+        self.utterances = 0
+        self.word_symbols = word_symbols
+        self.feature_symbols = feature_symbols
+
+        self._corpus_file = open_corpus_file(corpus_path)
+        self._pairs = read_pairs(read_lines(self._corpus_file, chunk_size),
+                                 self.interned)
+
+    def __iter__(self):
+        for words, features in self._pairs:
+            self.utterances += 1
+            if self.word_symbols is not None:
+                words = self.word_symbols.ids(words)
+            if self.feature_symbols is not None:
+                features = self.feature_symbols.ids(features)
+            yield words, features
+
+    def next_pair(self):
+        """
+        Return the next (words, features) pair of this Corpus, or ([], [])
+        once the corpus is exhausted.
+        """
+        for pair in self:
+            return pair
+        return [], []
+
+    def close(self):
+        self._corpus_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ThroughputMonitor(object):
+    """Report the progress and throughput of processing a corpus.
+
+    Members:
+        report_every -- the number of utterances between progress reports
+        utterances -- the number of utterances processed so far
+    """
+
+    def __init__(self, report_every=10000, clock=time.time):
+        self.report_every = report_every
+        self.utterances = 0
+
+        self._clock = clock
+        self._start = clock()
+        self._last_report = self._start
+        self._last_utterances = 0
+
+    def update(self, utterances=1):
+        """
+        Record that utterances more utterances were processed, and log the
+        progress every report_every utterances.
+        """
+        self.utterances += utterances
+        if self.utterances - self._last_utterances >= self.report_every:
+            now = self._clock()
+            logging.info("%d utterances processed, %.1f utterances/s "
+                         "(%.1f utterances/s overall)", self.utterances,
+                         (self.utterances - self._last_utterances) /
+                         max(now - self._last_report, 1e-9),
+                         self.rate(now))
+            self._last_report = now
+            self._last_utterances = self.utterances
+
+    def rate(self, now=None):
+        """Return the overall throughput, in utterances per second."""
+        if now is None:
+            now = self._clock()
+        return self.utterances / max(now - self._start, 1e-9)
+
+    def elapsed(self):
+        """Return the time since this ThroughputMonitor started, in s."""
+        return self._clock() - self._start
@@ -6,6 +6,7 @@ import numpy as np
 import os
 import sys
 
+import input
 import wmmapping
 
 
@@ -22,12 +23,27 @@ class Learner:
         feature_weight_sup, feature_weight_basic, feature_weight_sub, feature_weight_instance,
         feature_group_to_level_map,
         feature_to_feature_group_map,
-        novelty=False, decay=False
+        novelty=False, decay=False, lexicon_backend='dict'
     ):
         self._alpha = alpha
         self._beta = beta
 
-        self._learned_lexicon = wmmapping.Lexicon(
+        # The Lexicon backend: 'dict' for a graph of Meaning objects,
+        # 'sparse' for sparse matrices of alignments, or 'batched' for a
+        # batch of configurations, whose gamma, k, p, decay and feature
+        # weight parameters are arrays with one value per configuration
+        if lexicon_backend == 'dict':
+            lexicon_class = wmmapping.Lexicon
+        elif lexicon_backend == 'sparse':
+            import sparse_lexicon
+            lexicon_class = sparse_lexicon.SparseLexicon
+        elif lexicon_backend == 'batched':
+            import batched_lexicon
+            lexicon_class = batched_lexicon.BatchedLexicon
+        else:
+            raise NotImplementedError
+
+        self._learned_lexicon = lexicon_class(
             [],
             gamma_sup,
             gamma_basic,
@@ -53,6 +69,13 @@ class Learner:
             feature_to_feature_group_map,
         )
 
+        # The shape of the leading (configuration) axes of the meaning
+        # probabilities and alignments: () for a single configuration
+        if lexicon_backend == 'batched':
+            self._batch_shape = (self._learned_lexicon.num_configurations,)
+        else:
+            self._batch_shape = ()
+
         # Time wrt the word-feature pairings processed
         self._time = 1
 
@@ -61,15 +84,251 @@ class Learner:
         self._novelty = novelty
 
 
+    def cache_statistics(self):
+        """
+        Return the (hits, misses) of the gamma and denominator caches of the
+        learned Lexicon.
+        """
+        return self._learned_lexicon.cache_statistics()
+
+    def fork(self):
+        """
+        Return a copy of this Learner, in the same state, that can continue
+        learning and be tested independently of this Learner.
+        """
+        learner = copy.copy(self)
+        learner._learned_lexicon = self._learned_lexicon.snapshot()
+        return learner
+
     def gamma(self, word, feature):
         return self._learned_lexicon.gamma(word, feature)
 
+    def reparameterized(
+        self,
+        gamma_sup, gamma_basic, gamma_sub, gamma_instance,
+        k_sup, k_basic, k_sub, k_instance,
+        p_sup, p_basic, p_sub, p_instance,
+    ):
+        """
+        Return a fork of this Learner (see fork) with the gamma, k and p
+        parameters given, which are used only to compute meaning
+        probabilities from the associations learned so far.
+
+        The fork is in the state of a Learner trained with these parameters
+        only if the alignments learned so far do not depend on them: e.g.,
+        with alpha = 0 and no novelty, every alignment of an utterance of a
+        single word is 1, whatever gamma, k and p (> 0) are.
+        """
+        learner = copy.copy(self)
+        learner._learned_lexicon = self._learned_lexicon.reparameterized(
+            gamma_sup, gamma_basic, gamma_sub, gamma_instance,
+            k_sup, k_basic, k_sub, k_instance,
+            p_sup, p_basic, p_sub, p_instance,
+        )
+        return learner
+
+    def scratch(self, words=()):
+        """
+        Return a scratch copy of this Learner, whose Lexicon contains only
+        snapshots of the Meanings of words. Anything the copy learns is
+        discarded with it, and never reaches this Learner.
+        """
+        learner = copy.copy(self)
+        learner._learned_lexicon = self._learned_lexicon.snapshot(words=words)
+        return learner
+
     def k(self, word, feature):
         return self._learned_lexicon.k(word, feature)
 
+    def generalization_probs(self, words, scenes, metric='intersection',
+                             test_condition=None, log=False, times=None):
+        """
+        Return a (words x scenes) array of the probabilities of Learner to
+        generalize each of words to each of scenes; if log is True, return
+        the natural logarithms of the probabilities instead.
+
+        With the batched Lexicon, the probabilities have a leading
+        configuration axis: a (configurations x words x scenes) array is
+        returned.
+
+        If times is not None, return a (times x words x scenes) array of the
+        probabilities at each of times instead of at the current time, with
+        the probabilities of the features at all of times looked up at once
+        (see probs_at_times of the Lexicon), so that the probabilities after
+        a range of test delays come from a single trained Learner.
+
+        The probability of each feature of scenes is looked up once per word,
+        and the products and cosines over the features of each scene are
+        computed as array operations. The cosine metrics that learn the
+        meaning of a scene are computed scene by scene.
+
+        In the log domain, the products of the intersection and
+        hypothesis-space metrics are computed as sums of log-probabilities,
+        and the sums of the hypothesis-space metric by log-sum-exp, so that
+        they do not underflow on scenes with many features.
+        """
+        shape = self._batch_shape + (len(words), len(scenes))
+        if times is None:
+            gen_probs = np.empty(shape)
+        else:
+            gen_probs = np.empty((len(times),) + shape)
+
+        if not (metric.startswith('intersection') or
+                metric in ['cosine-without-test-distribution',
+                           'hypothesis-space']):
+
+            if self._batch_shape:
+                # The scene meanings are learned by a Meaning
+                raise NotImplementedError
+
+            if times is not None:
+                # Score a copy of this Learner at each of times
+                for t, time in enumerate(times):
+                    learner = copy.copy(self)
+                    learner._time = time
+                    gen_probs[t] = learner.generalization_probs(
+                        words, scenes, metric=metric,
+                        test_condition=test_condition, log=log)
+                return gen_probs
+
+            for i, word in enumerate(words):
+                for j, scene in enumerate(scenes):
+                    gen_probs[i, j] = self.generalization_prob(
+                        word, scene, metric=metric,
+                        test_condition=test_condition)
+
+            return np.log(gen_probs) if log else gen_probs
+
+        if metric == 'hypothesis-space':
+            assert test_condition is not None
+
+        # Index the features of each scene into the features of all the
+        # scenes, padding each scene to the same length with the index
+        # len(features)
+        features = sorted(set(feature for scene in scenes
+                              for feature in scene))
+        positions = dict((feature, i) for i, feature in enumerate(features))
+        width = max([len(scene) for scene in scenes] + [0])
+        index = np.empty((len(scenes), width), dtype=int)
+        index.fill(len(features))
+        for j, scene in enumerate(scenes):
+            index[j, :len(scene)] = [positions[feature] for feature in scene]
+        padding = index == len(features)
+
+        if metric == 'hypothesis-space':
+            # Mask the features at each level of the hierarchy
+            feature_levels = [
+                self._learned_lexicon.feature_group_to_level_map[
+                    self._learned_lexicon.feature_to_feature_group_map[feature]]
+                for feature in features]
+            levels = {}
+            for prefix, level in [('inst', 'instance'),
+                                  ('sup', 'superordinate'),
+                                  ('basic', 'basic-level'),
+                                  ('sub', 'subordinate')]:
+                levels[prefix] = np.array([feature_level == level for
+                                           feature_level in feature_levels] +
+                                          [False])[index]
+
+        for i, word in enumerate(words):
+
+            # Look up the probability of every feature once (at each time),
+            # with the padding feature at the end
+            if times is None:
+                probs = self._learned_lexicon.probs(word, features,
+                                                    self._decay, self._time)
+            else:
+                probs = self._learned_lexicon.probs_at_times(
+                    word, features, self._decay, times)
+            # (C-contiguous, so that the sums over the features of each scene
+            # are computed in the same order at each time)
+            scene_probs = np.ascontiguousarray(np.append(
+                probs, np.zeros(probs.shape[:-1] + (1,)), axis=-1)[..., index])
+
+            if log and metric != 'cosine-without-test-distribution':
+
+                with np.errstate(divide='ignore'):
+                    scene_log_probs = np.log(scene_probs)
+
+            if metric.startswith('intersection') and log:
+
+                gen_probs[..., i, :] = np.where(padding, 0.,
+                                                scene_log_probs).sum(axis=-1)
+
+            elif metric.startswith('intersection'):
+
+                gen_probs[..., i, :] = np.where(padding, 1.,
+                                                scene_probs).prod(axis=-1)
+
+            elif metric == 'cosine-without-test-distribution':
+
+                # The scene meaning vector is all ones
+                cos = scene_probs.sum(axis=-1)
+                squared_norm_x = (~padding).sum(axis=-1)
+                squared_norm_y = (scene_probs * scene_probs).sum(axis=-1)
+
+                gen_probs[..., i, :] = cos / (np.sqrt(squared_norm_x) *
+                                              np.sqrt(squared_norm_y))
+
+                if log:
+                    gen_probs[..., i, :] = np.log(gen_probs[..., i, :])
+
+            elif metric == 'hypothesis-space' and log:
+
+                def log_product(prefix):
+                    """Return the sums of the log-probs at a level."""
+                    return np.where(levels[prefix], scene_log_probs,
+                                    0.).sum(axis=-1)
+
+                log_gens = {}
+                log_gens['inst'] = log_product('inst')
+                log_gens['sup'] = log_gens['inst'] + log_product('sup')
+                log_gens['basic'] = log_gens['inst'] + log_product('basic')
+                log_gens['sub'] = log_gens['inst'] + log_product('sub')
+
+                # Any other test condition is scored by the subordinate
+                # hypothesis alone, as in the linear domain
+                if test_condition.startswith('sup'):
+                    gen_probs[..., i, :] = log_gens['sup']
+                elif test_condition.startswith('basic'):
+                    gen_probs[..., i, :] = np.logaddexp(log_gens['sup'],
+                                                        log_gens['basic'])
+                elif test_condition.startswith('sub'):
+                    gen_probs[..., i, :] = np.logaddexp.reduce(
+                        [log_gens['sup'], log_gens['basic'], log_gens['sub']])
+                else:
+                    gen_probs[..., i, :] = log_gens['sub']
+
+            elif metric == 'hypothesis-space':
+
+                def product(prefix):
+                    """Return the products of the probs at a level."""
+                    return np.where(levels[prefix], scene_probs,
+                                    1.).prod(axis=-1)
+
+                gens = {}
+                gens['inst'] = product('inst')
+                gens['sup'] = gens['inst'] * product('sup')
+                gens['basic'] = gens['inst'] * product('basic')
+                gens['sub'] = gens['inst'] * product('sub')
+
+                # Any other test condition is scored by the subordinate
+                # hypothesis alone, as before the products were batched
+                if test_condition.startswith('sup'):
+                    gen_probs[..., i, :] = gens['sup']
+                elif test_condition.startswith('basic'):
+                    gen_probs[..., i, :] = gens['sup'] + gens['basic']
+                elif test_condition.startswith('sub'):
+                    gen_probs[..., i, :] = \
+                        gens['sup'] + gens['basic'] + gens['sub']
+                else:
+                    gen_probs[..., i, :] = gens['sub']
+
+        return gen_probs
+
     def learned_lexicon(self):
         """Return a copy of the learned Lexicon."""
-        return copy.deepcopy(self._learned_lexicon)
+        return self._learned_lexicon.snapshot()
 
     def calculate_alignments(self, words, features):
         """Update the alignments between words and features.
@@ -78,40 +337,38 @@ class Learner:
         the list words and the set features:
 
             alignment: P(a|u,f) = p(f|w) / sum(w' in words) p(f|w')
-        """
-        for feature in features:
-
-            # Normalization term: sum(w' in words) p(f|w') + smoothing
-            denom = 0.0
-            for word in words:
-                denom += self._learned_lexicon.prob(word, feature, self._decay,
-                                                    self._time)
 
-            # Smoothing
-            denom += self._beta * self._alpha
+        The meaning probabilities of the (words x features) matrix are all
+        computed before the associations of the utterance are updated, and
+        the updates are then applied in bulk, one word at a time.
+        """
+        # p(f|w') for each w' in words and f in features
+        probs = np.array([self._learned_lexicon.probs(word, features,
+                                                      self._decay, self._time)
+                          for word in words]).reshape(
+                              (len(words),) + self._batch_shape +
+                              (len(features),))
 
-            # Calculate alignment of each word
-            for word in words:
+        # Normalization term: sum(w' in words) p(f|w') + smoothing
+        denoms = probs.sum(axis=0)
 
-                # alignment(w|f) = (P(f|w) + smoothing) / normalization
-                alignment = self._learned_lexicon.prob(word, feature,
-                                                       self._decay, self._time)
-                alignment += self._alpha
-                alignment /= denom
+        # Smoothing
+        denoms += self._beta * self._alpha
 
-                # Novelty
-                alignment *=\
-                    self._learned_lexicon.novelty(word) if self._novelty else 1
+        # alignment(w|f) = (P(f|w) + smoothing) / normalization
+        alignments = probs + self._alpha
+        alignments /= denoms
 
-                # assoc_t(f,w) = assoc_{t-1}(f,w) + P(a|u,f)
-                self._learned_lexicon.update_association(word, feature,
-                                                         alignment,
-                                                         self._decay,
-                                                         self._time)
+        for word, word_alignments in zip(words, alignments):
 
-            # End alignment calculation for each word
+            # Novelty
+            if self._novelty:
+                word_alignments *= self._learned_lexicon.novelty(word)
 
-        # End alignment calculation for each feature
+            # assoc_t(f,w) = assoc_{t-1}(f,w) + P(a|u,f)
+            self._learned_lexicon.update_associations(word, features,
+                                                      word_alignments,
+                                                      self._decay, self._time)
 
         for word in words:
 
@@ -128,13 +385,17 @@ class Learner:
         if time_increment:
             self._time += 1
 
-    def process_corpus(self, corpus_path, outdir, corpus=None):
+    def process_corpus(self, corpus_path, outdir, corpus=None,
+                       report_every=10000):
         """
         Process the corpus file located at corpus_path. The file at corpus_path
         should contains sentences and their meanings. If a Corpus corpus is
         presented, the corpus_path is ignored and the corpus provided from is
         read instead.
 
+        The corpus is streamed, so that the memory in use by the reader does
+        not grow with its size; the progress and throughput are logged every
+        report_every utterances. Return the ThroughputMonitor of the run.
         """
         close_corpus = False
         if corpus is None:
@@ -144,33 +405,36 @@ class Learner:
             corpus = input.Corpus(corpus_path)
             close_corpus = True
 
-        (words, features) = corpus.next_pair()
+        monitor = input.ThroughputMonitor(report_every=report_every)
+
+        try:
+            for (words, features) in corpus:
 
-        while words != []:
+                self.process_pair(words, features, outdir)
+                monitor.update()
 
-            self.process_pair(words, features, outdir)
+            # End processing words-sentences pairs from corpus
 
-            (words, features) = corpus.next_pair()
+        finally:
+            if close_corpus:
+                corpus.close()
 
-        # End processing words-sentences pairs from corpus
+        logging.info("Processed %d utterances in %.2f s (%.1f utterances/s)",
+                     monitor.utterances, monitor.elapsed(), monitor.rate())
 
-        if close_corpus:
-            corpus.close()
+        return monitor
 
     def generalization_prob(self, word, scene, metric='intersection',
                             test_condition=None):
         """Return the probability of Learner to generalize word to scene."""
 
-        if metric.startswith('intersection'):
+        if metric.startswith('intersection') or \
+                metric in ['cosine-without-test-distribution',
+                           'hypothesis-space']:
 
-            gen_prob = 1.
-
-            for feature in scene:
-                prob = self._learned_lexicon.prob(word, feature, self._decay,
-                                                  self._time)
-                gen_prob *= prob
-                #print('\t\t\t\t',feature, prob)
-                #raw_input()
+            gen_prob = self.generalization_probs(
+                [word], [scene], metric=metric,
+                test_condition=test_condition)[..., 0, 0]
 
         elif metric in ['truncated-cosine-same-word',
                         'cosine-full-distribution-same-word',
@@ -179,104 +443,35 @@ class Learner:
 
             learned_meaning = self._learned_lexicon.meaning(word)
 
-            dummy_word = 'DUMMY_WORD_' + str(scene)
-
+            # Learn the meaning of the scene in a scratch copy of this
+            # Learner, which is discarded afterwards: for the same-word
+            # metrics, as an update of the learned meaning of word; for the
+            # novel-word metrics, as the meaning of a 'dummy word'
             if metric.endswith('same-word'):
-
-                # Initialise the scene meaning to be the same as the learned
-                # meaning of the target word
-                scene_meaning = copy.deepcopy(learned_meaning)
-                scene_meaning._word = dummy_word
-                self._learned_lexicon._word_meanings[dummy_word] = scene_meaning
-
-            # Learn the meaning of the scene as a 'dummy meaning'
-            self.process_pair([dummy_word], scene, './', time_increment=False)
-            scene_meaning = self._learned_lexicon.meaning(dummy_word)
-
-            gen_prob = cosine(learned_meaning, scene_meaning,
+                scene_word = word
+                scratch = self.scratch(words=[word])
+            else:
+                scene_word = 'DUMMY_WORD_' + str(scene)
+                scratch = self.scratch(words=[])
+
+            scratch.process_pair([scene_word], scene, './',
+                                 time_increment=False)
+            scene_meaning = scratch._learned_lexicon.meaning(scene_word)
+
+            gen_prob = cosine(learned_meaning, scene_meaning, self._decay,
+                              self._time,
                               full_distribution=True if
                               metric.startswith('cosine-full-distribution') else
                               False)
 
-        elif metric in ['cosine-without-test-distribution']:
-
-            scene_meaning_vec = np.zeros(len(scene))
-            learned_meaning_vec = np.zeros(len(scene))
-
-            for i, feature in enumerate(scene):
-                scene_meaning_vec[i] = 1.
-                learned_meaning_vec[i] = self._learned_lexicon.prob(word, feature)
-
-            cos = np.dot(scene_meaning_vec, learned_meaning_vec)
-            squared_norm_x = np.dot(scene_meaning_vec, scene_meaning_vec)
-            squared_norm_y = np.dot(learned_meaning_vec, learned_meaning_vec)
-
-            gen_prob = cos / (math.sqrt(squared_norm_x) * math.sqrt(squared_norm_y))
-
-        elif metric == 'hypothesis-space':
-
-            assert test_condition is not None
-
-
-            gens = {}
-
-            gen_prob = 1.
-
-            subset_scene = [feature for feature in scene if feature.startswith('inst')]
-
-            for feature in subset_scene:
-                prob = self._learned_lexicon.prob(word, feature, self._decay,
-                                                self._time)
-                gen_prob *= prob
-
-            gens['inst'] = gen_prob
-
-            subset_scene = [feature for feature in scene if feature.startswith('sup')]
-
-            for feature in subset_scene:
-                prob = self._learned_lexicon.prob(word, feature, self._decay,
-                                                self._time)
-                gen_prob *= prob
-
-            gens['sup'] = gen_prob
-
-            gen_prob = gens['inst']
-
-            subset_scene = [feature for feature in scene if feature.startswith('basic')]
-
-            for feature in subset_scene:
-                prob = self._learned_lexicon.prob(word, feature, self._decay,
-                                                self._time)
-                gen_prob *= prob
-
-            gens['basic'] = gen_prob
-
-            gen_prob = gens['inst']
-
-            subset_scene = [feature for feature in scene if feature.startswith('sub')]
-
-            for feature in subset_scene:
-                prob = self._learned_lexicon.prob(word, feature, self._decay,
-                                                self._time)
-                gen_prob *= prob
-
-            gens['sub'] = gen_prob
-
-            if test_condition.startswith('sup'):
-                gen_prob = gens['sup']
-            if test_condition.startswith('basic'):
-                gen_prob = gens['sup'] + gens['basic']
-            if test_condition.startswith('sub'):
-                gen_prob = gens['sup'] + gens['basic'] + gens['sub']
-
         else:
             raise NotImplementedError
 
         return gen_prob
 
 
-def cosine(meaning1, meaning2, full_distribution=True):
-    """Return the cosine similarity of meaning1 and meaning2."""
+def cosine(meaning1, meaning2, decay, time, full_distribution=True):
+    """Return the cosine similarity of meaning1 and meaning2 at time."""
 
     cos = 0
     squared_norm_x = 0
@@ -287,19 +482,16 @@ def cosine(meaning1, meaning2, full_distribution=True):
 
     # Loop over the feature groups and find features seen between the two
     # Meanings
-    for fgn in feature_group_names:
+    for fgn in sorted(feature_group_names):
 
         feature_group_1 = meaning1.feature_group(fgn)
         feature_group_2 = meaning2.feature_group(fgn)
 
-        features = feature_group_1.seen_features() | feature_group_2.seen_features()
+        features = sorted(feature_group_1.seen_features() |
+                          feature_group_2.seen_features())
 
-        meaning1_vec = np.zeros(len(features))
-        meaning2_vec = np.zeros(len(features))
-
-        for i, feature in enumerate(features):
-            meaning1_vec[i] = meaning1.prob(feature)
-            meaning2_vec[i] = meaning2.prob(feature)
+        meaning1_vec = feature_group_1.probs(features, decay, time)
+        meaning2_vec = feature_group_2.probs(features, decay, time)
 
         cos += np.dot(meaning1_vec, meaning2_vec)
         squared_norm_x += np.dot(meaning1_vec, meaning1_vec)
@@ -312,13 +504,13 @@ def cosine(meaning1, meaning2, full_distribution=True):
             k = feature_group_1.k()
             seen_count = len(features)
 
-            cos += (k - seen_count) * feature_group_1.unseen_prob() *\
-                feature_group_2.unseen_prob()
+            unseen_prob_1 = feature_group_1.unseen_prob(decay, time)
+            unseen_prob_2 = feature_group_2.unseen_prob(decay, time)
+
+            cos += (k - seen_count) * unseen_prob_1 * unseen_prob_2
 
-            squared_norm_x += pow(feature_group_1.unseen_prob(), 2) *\
-                (k - seen_count)
+            squared_norm_x += pow(unseen_prob_1, 2) * (k - seen_count)
 
-            squared_norm_y += pow(feature_group_2.unseen_prob(), 2) *\
-                (k - seen_count)
+            squared_norm_y += pow(unseen_prob_2, 2) * (k - seen_count)
 
     return cos / (math.sqrt(squared_norm_x) * math.sqrt(squared_norm_y))
@@ -0,0 +1,475 @@
+from __future__ import division
+
+
+import array
+import copy
+import numpy as np
+import scipy.sparse
+
+import wmmapping
+
+
+"""
+sparse_lexicon.py
+
+A Lexicon that stores the alignments of every word to every feature in
+sparse matrices, indexed by interned word and feature ids, instead of in a
+graph of Meaning, FeatureGroup and Feature objects.
+"""
+
+
+class SparseRows(object):
+    """An append-only sparse matrix of counts, read one row at a time.
+
+    New entries are buffered in typed arrays, which are flushed into a list
+    of immutable CSR matrices (levels) of decreasing size; the smaller levels
+    are merged into the larger ones as they grow, so that appending an entry
+    and reading a row both take time logarithmic in the number of entries.
+    Entries with the same (row, column) are summed.
+    """
+
+    # The number of buffered entries that are flushed into a level
+    flush_size = 1024
+
+    def __init__(self):
+        self._levels = []
+        self._rows = array.array('l')
+        self._cols = array.array('l')
+        self._data = array.array('l')
+
+    def __len__(self):
+        return sum(level.nnz for level in self._levels) + len(self._rows)
+
+    def append(self, row, cols, data):
+        """Add data[i] to the entry (row, cols[i]), for each i."""
+        self._rows.extend([row] * len(cols))
+        self._cols.extend(cols)
+        self._data.extend(data)
+        if len(self._rows) >= self.flush_size:
+            self._flush()
+
+    def row(self, row):
+        """Return the (columns, data) arrays of the entries of row."""
+        cols = []
+        data = []
+        for level in self._levels:
+            if row < level.shape[0]:
+                start, end = level.indptr[row], level.indptr[row + 1]
+                cols.append(level.indices[start:end])
+                data.append(level.data[start:end])
+
+        if len(self._rows) > 0:
+            pending = np.frombuffer(self._rows, dtype=np.int_) == row
+            cols.append(np.frombuffer(self._cols, dtype=np.int_)[pending])
+            data.append(np.frombuffer(self._data, dtype=np.int_)[pending])
+
+        if not cols:
+            return np.empty(0, dtype=np.int_), np.empty(0, dtype=np.int_)
+        return np.concatenate(cols), np.concatenate(data)
+
+    def snapshot(self):
+        """
+        Return a copy of this SparseRows, which shares its (immutable)
+        levels with this SparseRows.
+        """
+        result = copy.copy(self)
+        result._levels = list(self._levels)
+        result._rows = array.array('l', self._rows)
+        result._cols = array.array('l', self._cols)
+        result._data = array.array('l', self._data)
+        return result
+
+    def _flush(self):
+        """Flush the buffered entries into a new level, and merge levels."""
+        level = self._csr([(np.array(self._rows), np.array(self._cols),
+                            np.array(self._data))])
+        self._rows = array.array('l')
+        self._cols = array.array('l')
+        self._data = array.array('l')
+
+        self._levels.append(level)
+        while len(self._levels) >= 2 and \
+                self._levels[-2].nnz <= 2 * self._levels[-1].nnz:
+            smaller = self._levels.pop()
+            larger = self._levels.pop()
+            self._levels.append(self._csr([self._coo(larger),
+                                           self._coo(smaller)]))
+
+    @staticmethod
+    def _coo(level):
+        coo = level.tocoo()
+        return coo.row, coo.col, coo.data
+
+    @staticmethod
+    def _csr(entries):
+        rows = np.concatenate([r for r, c, d in entries])
+        cols = np.concatenate([c for r, c, d in entries])
+        data = np.concatenate([d for r, c, d in entries])
+        shape = (rows.max() + 1, cols.max() + 1)
+        return scipy.sparse.csr_matrix((data, (rows, cols)), shape=shape)
+
+
+class SparseLexicon(object):
+    """
+    A SparseLexicon maps words to meanings, as Lexicon does, but stores the
+    alignments in sparse matrices.
+
+    Each distinct (feature, time, alignment) triple is interned as an event,
+    and the alignments of a word are the counts of the events of its row of
+    a (word x event) sparse matrix. The meaning probabilities of a word are
+    computed for all the features at once, and cached until the word is next
+    updated or the time changes.
+
+    Members:
+        feature_group_to_level_map -- a dict of (feature group -> hierarchy
+            level)
+        feature_to_feature_group_map -- a dict of (feature -> feature group)
+    """
+
+    def __init__(
+        self, words,
+        gamma_sup, gamma_basic, gamma_sub, gamma_instance,
+        k_sup, k_basic, k_sub, k_instance,
+        p_sup, p_basic, p_sub, p_instance,
+        decay_sup, decay_basic, decay_sub, decay_instance,
+        feature_weight_sup, feature_weight_basic, feature_weight_sub, feature_weight_instance,
+        feature_group_to_level_map,
+        feature_to_feature_group_map,
+    ):
+        self.feature_group_to_level_map = feature_group_to_level_map
+        self.feature_to_feature_group_map = feature_to_feature_group_map
+
+        # The feature space, from which the parameters of each feature group
+        # are read, and the Meanings of words are built
+        self._schema = wmmapping.MeaningSchema(
+            gamma_sup, gamma_basic, gamma_sub, gamma_instance,
+            k_sup, k_basic, k_sub, k_instance,
+            p_sup, p_basic, p_sub, p_instance,
+            decay_sup, decay_basic, decay_sub, decay_instance,
+            feature_weight_sup, feature_weight_basic, feature_weight_sub,
+            feature_weight_instance,
+            feature_group_to_level_map,
+            feature_to_feature_group_map,
+        )
+
+        # Feature and feature group ids
+        self._features = sorted(feature_to_feature_group_map)
+        self._feature_ids = dict((feature, i) for i, feature in
+                                 enumerate(self._features))
+        groups = sorted(set(feature_to_feature_group_map.values()))
+        group_ids = dict((group, j) for j, group in enumerate(groups))
+        self._feature_groups = np.array(
+            [group_ids[feature_to_feature_group_map[feature]] for feature in
+             self._features], dtype=np.int_)
+
+        self._groups = groups
+        self._read_params()
+
+        # The events, which are shared with every snapshot of this
+        # SparseLexicon
+        self._event_ids = {}
+        self._event_features = array.array('l')
+        self._event_times = array.array('l')
+        self._event_alignments = array.array('d')
+
+        # Word ids, and the (word x event) alignment counts and (word x
+        # feature) seen features
+        self._word_ids = {}
+        self._num_rows = 0
+        self._alignments = SparseRows()
+        self._seen_features = SparseRows()
+
+        # The meaning probabilities of each word, keyed by (decay, time)
+        self._cached_probs = {}
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+        for word in words:
+            self.initialize_new_meaning(word)
+
+    def _read_params(self):
+        # The parameters of each feature group, by feature group id
+        params = [self._schema.feature_group_params[group] for group in
+                  self._groups]
+        self._gammas = np.array([gamma for gamma, k, p, decay, fw in params])
+        self._ks = np.array([k for gamma, k, p, decay, fw in params])
+        self._ps = np.array([p for gamma, k, p, decay, fw in params])
+        self._decays = np.array([decay for gamma, k, p, decay, fw in params])
+
+    def initialize_new_meaning(self, word):
+        """Add word, with an empty meaning, to this SparseLexicon."""
+        assert word not in self._word_ids
+        self._word_ids[word] = self._num_rows
+        self._num_rows += 1
+        return self._word_ids[word]
+
+    def _word_id(self, word):
+        """Return the id of word, adding word if it is new."""
+        try:
+            return self._word_ids[word]
+        except KeyError:
+            return self.initialize_new_meaning(word)
+
+    def _feature_id_array(self, features):
+        try:
+            return np.array([self._feature_ids[feature] for feature in
+                             features], dtype=np.int_)
+        except KeyError:
+            raise wmmapping.UndefinedFeatureError(features)
+
+    def _event_id(self, feature_id, time, alignment):
+        """Return the id of the event (feature_id, time, alignment)."""
+        key = (feature_id, time, alignment)
+        try:
+            return self._event_ids[key]
+        except KeyError:
+            self._event_ids[key] = len(self._event_features)
+            self._event_features.append(feature_id)
+            self._event_times.append(time)
+            self._event_alignments.append(alignment)
+            return self._event_ids[key]
+
+    def _events(self, word_id):
+        """
+        Return the (features, times, alignments, counts) arrays of the
+        distinct events of word_id.
+        """
+        events, counts = self._alignments.row(word_id)
+        if len(events) == 0:
+            return events, events, np.empty(0), counts
+        features = np.frombuffer(self._event_features, dtype=np.int_)[events]
+        times = np.frombuffer(self._event_times, dtype=np.int_)[events]
+        alignments = np.frombuffer(self._event_alignments)[events]
+        return features, times, alignments, counts
+
+    def _all_probs(self, word, decay, time):
+        """
+        Return an array of the meaning probabilities of every feature, given
+        word.
+        """
+        word_id = self._word_id(word)
+
+        key = (decay, time)
+        cached = self._cached_probs.get(word_id)
+        if cached is not None and cached[0] == key:
+            self._cache_hits += 1
+            return cached[1]
+        self._cache_misses += 1
+
+        probs = self._all_probs_at_times(word_id, decay, [time])[0]
+
+        self._cached_probs[word_id] = (key, probs)
+        return probs
+
+    def _all_probs_at_times(self, word_id, decay, times):
+        """
+        Return a (times x features) array of the meaning probabilities of
+        every feature, given word_id, at each of times; the decay term of
+        every alignment is computed for all of times in one array expression.
+        """
+        num_times = len(times)
+        num_features = len(self._features)
+        features, times_aligned, alignments, counts = self._events(word_id)
+
+        if len(features) == 0:
+            associations = np.zeros((num_times, num_features))
+            counts_per_feature = associations[0]
+
+        elif decay:
+            # Weight each alignment by the proportion of all the alignments
+            # of its feature that occurred at its time, and decay it
+            counts_per_feature = np.bincount(features, weights=counts,
+                                             minlength=num_features)
+            keys = features * (times_aligned.max() + 1) + times_aligned
+            unique_keys, inverse = np.unique(keys, return_inverse=True)
+            counts_per_time = np.bincount(inverse, weights=counts)[inverse]
+
+            a = alignments * counts_per_time / counts_per_feature[features]
+            decays = self._decays[self._feature_groups[features]]
+            with np.errstate(over='ignore'):
+                decayed = counts * a / np.power(
+                    np.asarray(times)[:, np.newaxis] - times_aligned + 1,
+                    decays / a)
+
+            associations = wmmapping.bincount_rows(features, decayed,
+                                                   num_features)
+
+        else:
+            counts_per_feature = np.bincount(features, weights=counts,
+                                             minlength=num_features)
+            associations = np.tile(
+                np.bincount(features, weights=counts * alignments,
+                            minlength=num_features), (num_times, 1))
+
+        # gamma * (number of feature types aligned to word)^p, and the
+        # denominator of each feature group
+        num_groups = len(self._gammas)
+        num_types = np.bincount(self._feature_groups,
+                                weights=counts_per_feature > 0,
+                                minlength=num_groups)
+        gammas = self._gammas * np.maximum(num_types, 1) ** self._ps
+        denoms = wmmapping.bincount_rows(
+            self._feature_groups,
+            associations, num_groups) + self._ks * gammas
+
+        return (associations + gammas[self._feature_groups]) / \
+            denoms[:, self._feature_groups]
+
+    def add_seen_features(self, word, features):
+        """
+        Add features to the list of features encountered so far with word.
+        """
+        assert word in self._word_ids
+        feature_ids = self._feature_id_array(features)
+        self._seen_features.append(self._word_ids[word], feature_ids,
+                                   np.ones(len(feature_ids), dtype=np.int_))
+
+    def cache_statistics(self):
+        """
+        Return the (hits, misses) of the meaning probability cache of this
+        SparseLexicon.
+        """
+        return self._cache_hits, self._cache_misses
+
+    def gamma(self, word, feature):
+        """
+        Return the gamma of the feature group of feature, given word, at
+        time 0.
+        """
+        return self.meaning(word).gamma(feature)
+
+    def k(self, word, feature):
+        """Return the k parameter of the feature group of feature."""
+        return self._ks[self._feature_groups[self._feature_ids[feature]]]
+
+    def meaning(self, word):
+        """
+        Return a Meaning object built from the alignments of word; the
+        Meaning is a copy, and updates to it do not reach this
+        SparseLexicon.
+        """
+        word_id = self._word_id(word)
+        meaning = wmmapping.Meaning(self._schema, word=word)
+
+        features, times, alignments, counts = self._events(word_id)
+        for i in np.argsort(times, kind='mergesort'):
+            for _ in range(counts[i]):
+                meaning.update_association(self._features[features[i]],
+                                           alignments[i], False, times[i])
+
+        seen_features = self.seen_features(word)
+        if seen_features:
+            meaning.add_seen_features(list(seen_features))
+
+        return meaning
+
+    def novelty(self, word):
+        raise NotImplementedError
+
+    def prob(self, word, feature, decay, time):
+        """
+        Return the probability of feature being part of the meaning of word.
+        """
+        try:
+            feature_id = self._feature_ids[feature]
+        except KeyError:
+            raise wmmapping.UndefinedFeatureError(feature)
+        return self._all_probs(word, decay, time)[feature_id]
+
+    def probs(self, word, features, decay, time):
+        """
+        Return an array of the probabilities of each of features being part of
+        the meaning of word.
+        """
+        feature_ids = self._feature_id_array(features)
+        return self._all_probs(word, decay, time)[feature_ids]
+
+    def probs_at_times(self, word, features, decay, times):
+        """
+        Return a (times x features) array of the probabilities of each of
+        features being part of the meaning of word, at each of times.
+        """
+        feature_ids = self._feature_id_array(features)
+        return self._all_probs_at_times(self._word_id(word), decay,
+                                        times)[:, feature_ids]
+
+    def seen_features(self, word):
+        """Return the set of features encountered so far with word."""
+        if word not in self._word_ids:
+            return set()
+        feature_ids, counts = self._seen_features.row(self._word_ids[word])
+        return set(self._features[i] for i in feature_ids)
+
+    def snapshot(self, words=None):
+        """
+        Return a copy of this SparseLexicon, which shares its stored
+        alignments with this SparseLexicon; the alignments are immutable
+        once stored, so that either copy can be updated independently.
+
+        If words is not None, the copy contains only those of words that are
+        in this SparseLexicon.
+        """
+        result = copy.copy(self)
+
+        if words is None:
+            result._word_ids = self._word_ids.copy()
+        else:
+            result._word_ids = dict((word, self._word_ids[word]) for word in
+                                    words if word in self._word_ids)
+
+        result._alignments = self._alignments.snapshot()
+        result._seen_features = self._seen_features.snapshot()
+        result._cached_probs = self._cached_probs.copy()
+
+        return result
+
+    def reparameterized(
+        self,
+        gamma_sup, gamma_basic, gamma_sub, gamma_instance,
+        k_sup, k_basic, k_sub, k_instance,
+        p_sup, p_basic, p_sub, p_instance,
+    ):
+        """
+        Return a snapshot of this SparseLexicon (see snapshot) with the gamma,
+        k and p parameters given; the stored alignments are kept, as they are
+        independent of these parameters.
+        """
+        result = self.snapshot()
+        result._schema = self._schema.reparameterized(
+            gamma_sup, gamma_basic, gamma_sub, gamma_instance,
+            k_sup, k_basic, k_sub, k_instance,
+            p_sup, p_basic, p_sub, p_instance,
+        )
+        result._read_params()
+        result._cached_probs = {}
+        return result
+
+    def update_association(self, word, feature, alignment, decay, time):
+        """
+        Update association between word and feature by adding alignment to
+        the current association.
+        """
+        self.update_associations(word, [feature], [alignment], decay, time)
+
+    def update_associations(self, word, features, alignments, decay, time):
+        """
+        Update the associations between word and each of features by adding
+        the corresponding alignment of alignments.
+        """
+        word_id = self._word_id(word)
+        time = int(time)
+
+        events = []
+        for feature, alignment in zip(features, alignments):
+            if alignment > 0:
+                feature_id = self._feature_ids[feature]
+                events.append(self._event_id(feature_id, time,
+                                             float(alignment)))
+
+        if events:
+            self._alignments.append(word_id, events, [1] * len(events))
+            self._cached_probs.pop(word_id, None)
+
+    def words(self):
+        """Return a set of all words in this SparseLexicon."""
+        return set(self._word_ids.keys())
@@ -0,0 +1,83 @@
+"""
+symbols.py
+
+Interning of the words, features and feature groups of a feature space and
+its corpora as dense integer ids, so that the learner works on ints, and the
+strings are needed only to read the data and to report results.
+"""
+
+
+class SymbolTable(object):
+    """A bijection between symbols (e.g., feature strings) and dense ids.
+
+    The id of a symbol is the number of symbols added before it.
+    """
+
+    def __init__(self, symbols=()):
+        self._ids = {}
+        self._symbols = []
+        for symbol in symbols:
+            self.id(symbol)
+
+    def __contains__(self, symbol):
+        return symbol in self._ids
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def __repr__(self):
+        return "SymbolTable: " + repr(self._symbols)
+
+    def id(self, symbol):
+        """Return the id of symbol, adding symbol if it is new."""
+        try:
+            return self._ids[symbol]
+        except KeyError:
+            self._ids[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+            return self._ids[symbol]
+
+    def ids(self, symbols):
+        """Return a list of the ids of symbols, adding any new symbols."""
+        return [self.id(symbol) for symbol in symbols]
+
+    def symbol(self, i):
+        """Return the symbol with id i."""
+        return self._symbols[i]
+
+    def symbols(self, ids):
+        """Return a list of the symbols with ids."""
+        return [self._symbols[i] for i in ids]
+
+
+def intern_feature_space(feature_group_to_level_map,
+                         feature_to_feature_group_map, features=None,
+                         feature_groups=None):
+    """
+    Return the (feature group id -> level) and (feature id -> feature group
+    id) maps of a feature space, with the features and feature groups
+    interned in the SymbolTables features and feature_groups (new
+    SymbolTables, if None), and the two SymbolTables.
+
+    The features and feature groups are interned in sorted order, so that
+    their ids do not depend on the order of the maps.
+    """
+    if features is None:
+        features = SymbolTable()
+    if feature_groups is None:
+        feature_groups = SymbolTable()
+
+    for feature_group in sorted(feature_group_to_level_map):
+        feature_groups.id(feature_group)
+    for feature in sorted(feature_to_feature_group_map):
+        features.id(feature)
+
+    feature_group_to_level_map = dict(
+        (feature_groups.id(feature_group), level) for feature_group, level in
+        feature_group_to_level_map.items())
+    feature_to_feature_group_map = dict(
+        (features.id(feature), feature_groups.id(feature_group)) for
+        feature, feature_group in feature_to_feature_group_map.items())
+
+    return (feature_group_to_level_map, feature_to_feature_group_map,
+            features, feature_groups)
@@ -1,7 +1,9 @@
 from __future__ import division
 
 
+import array
 import copy
+import math
 import numpy as np
 import pprint
 
@@ -40,43 +42,137 @@ class UndefinedParameterError(Exception):
 
 
 class Alignments(object):
+    """The alignments of a feature to a word.
+
+    Alignments are stored both as a history of times and alignment values, in
+    growable typed arrays, and as per-time aggregates, a dict of (time ->
+    (alignment -> multiplicity)), so that a sum over the history can be
+    computed in time linear in the number of distinct (time, alignment) pairs
+    rather than in the number of alignments. The storage is allocated when
+    the first alignment is added, so that the Alignments of a feature that
+    was never aligned to the word are cheap.
     """
-    TODO
-    """
+    __slots__ = ('_times', '_values', '_aggregates', '_last_time',
+                 '_weighted_alignments', '_cached_key', '_cached_sum')
+
     def __init__(self):
-        self._alignments = []
+        self._times = None
+        self._values = None
+        self._aggregates = None
+        self._last_time = 0
+        self._weighted_alignments = ()
+
+        # The most recent decayed sum, keyed by (decay, time)
+        self._cached_key = None
+        self._cached_sum = None
 
     def __contains__(self, time):
         """Return True if there is an alignment at time."""
-        return int(time) in [t for (t, align) in self._alignments]
+        return self._aggregates is not None and int(time) in self._aggregates
 
     def __deepcopy__(self, memo):
         c = self.__class__
         result = c.__new__(c)
         memo[id(self)] = result
-        for k, v in self.__dict__.items():
-            setattr(result, k, copy.deepcopy(v, memo))
+        for k in self.__slots__:
+            setattr(result, k, getattr(self, k))
+
+        # The weighted alignments are replaced, rather than modified, when an
+        # alignment is added, so they are shared with the copy
+        if self._times is None:
+            return result
+
+        result._times = array.array('l', self._times)
+        result._values = array.array('d', self._values)
+        result._aggregates = dict((t, aggregate.copy()) for t, aggregate in
+                                  self._aggregates.items())
 
         return result
 
     def __len__(self):
-        return len(self._alignments)
+        return len(self._times) if self._times is not None else 0
 
     def __repr__(self):
-        return "Alignments: " + str(self._alignments)
+        return "Alignments: " + str(self.alignments())
 
     def add_alignment(self, time, alignment):
-        self._alignments.append((int(time), alignment))
+        time = int(time)
+
+        if self._times is None:
+            self._times = array.array('l')
+            self._values = array.array('d')
+            self._aggregates = {}
+
+        self._times.append(time)
+        self._values.append(alignment)
+
+        aggregate = self._aggregates.setdefault(time, {})
+        aggregate[alignment] = aggregate.get(alignment, 0) + 1
+        self._last_time = max(self._last_time, time)
+
+        self._weighted_alignments = None
+        self._cached_key = None
 
     def alignments(self):
-        return self._alignments
+        """Return a list of the (time, alignment) pairs."""
+        if self._times is None:
+            return []
+        return list(zip(self._times, self._values))
 
     def count(self, t):
         """Return a count of the number of alignments at time t."""
-        return len([1 for align in self._alignments if align[0] == t])
+        if t not in self:
+            return 0
+        return sum(self._aggregates[t].values())
+
+    def decayed_sum(self, decay, time):
+        """Return the sum of the alignments, decayed to time.
+
+        Each alignment is weighted by the proportion of all alignments that
+        occurred at its time, and then decayed as a power of the time elapsed
+        since it occurred:
+
+            sum((t, a) in alignments) a' / (time - t + 1)^(decay / a'),
+            where a' = a * count(t) / len(alignments)
+        """
+        if self._cached_key == (decay, time):
+            return self._cached_sum
+
+        decayed_sum = 0.0
+        for t, a, multiplicity in self.weighted_alignments():
+            try:
+                decayed_sum += \
+                    multiplicity * a / math.pow(time - t + 1, decay / a)
+            except OverflowError:
+                # The alignment has decayed to nothing
+                pass
+
+        self._cached_key = (decay, time)
+        self._cached_sum = decayed_sum
+
+        return decayed_sum
 
     def last_time(self):
-        return max([t for (t, align) in self._alignments]) if self._alignments else 0
+        return self._last_time
+
+    def weighted_alignments(self):
+        """
+        Return a list of (time, weighted alignment, multiplicity) triples, one
+        for each distinct (time, alignment) pair, where each alignment is
+        weighted by the proportion of all alignments that occurred at its
+        time.
+        """
+        if self._weighted_alignments is None:
+            num_alignments = len(self._times)
+            self._weighted_alignments = []
+            for t, aggregate in self._aggregates.items():
+                share = sum(aggregate.values()) / num_alignments
+                for align, multiplicity in aggregate.items():
+                    self._weighted_alignments.append((t, align * share,
+                                                      multiplicity))
+
+        return self._weighted_alignments
+
 
 class Feature(object):
     """A feature event, conditional upon a word.
@@ -87,6 +183,9 @@ class Feature(object):
         alignments -- an Alignment object containing the alignments of feature
             to the word
     """
+    __slots__ = ('_association', '_name', '_decay', '_feature_weight',
+                 '_alignments')
+
     def __init__(self, name, decay, feature_weight):
         self._association = 0.0
         self._name = name
@@ -98,8 +197,11 @@ class Feature(object):
         c = self.__class__
         result = c.__new__(c)
         memo[id(self)] = result
-        for k, v in self.__dict__.items():
-            setattr(result, k, copy.deepcopy(v, memo))
+        result._association = self._association
+        result._name = self._name
+        result._decay = self._decay
+        result._feature_weight = self._feature_weight
+        result._alignments = self._alignments.__deepcopy__(memo)
 
         return result
 
@@ -138,21 +240,8 @@ class Feature(object):
             self._alignments.add_alignment(time, alignment)
 
         if decay:
-            self._association = 0
-            for (t, align) in self._alignments.alignments():
-                #a = align * np.power(self._feature_weight, self._alignments.count(t))
-                #a = align * np.power(self._alignments.count(t), 2)
-                #raw_input()
-                #a = align / (np.power(self._feature_weight, 1/self._alignments.count(t)))
-                #a = align
-                #a = align * np.power(self._alignments.count(t), self._feature_weight)
-
-                # try tf-idf
-                #a = align * np.power(self._feature_weight, 1 / (self._alignments.count(t) / len(self._alignments)))
-                #a = np.power(align, 1 / (self._alignments.count(t) / len(self._alignments)))
-                a = align * (self._alignments.count(t) / len(self._alignments))
-
-                self._association += a / np.power(time - t + 1, (self._decay/a))
+            self._association = self._alignments.decayed_sum(self._decay,
+                                                             time)
 
         else:
             self._association += alignment
@@ -161,11 +250,19 @@ class Feature(object):
 class FeatureGroup(object):
     """A feature group, conditional upon a word.
 
+    The state of a Feature is created when the feature is first aligned to
+    the word; until then, its association is zero.
+
     Members:
         TODO
     """
+    __slots__ = ('_name', '_gamma', '_k', '_p', '_decay', '_feature_weight',
+                 '_all_features', '_features', '_frozen', '_owned_features',
+                 '_cached_gamma', '_cached_denom_key', '_cached_denom',
+                 '_cache_hits', '_cache_misses')
 
-    def __init__(self, gamma, k, p, decay, feature_weight, name=None):
+    def __init__(self, gamma, k, p, decay, feature_weight, name=None,
+                 features=()):
 
         self._name = name
 
@@ -175,23 +272,42 @@ class FeatureGroup(object):
         self._decay = decay
         self._feature_weight = feature_weight
 
+        # All the features of this FeatureGroup, and the Features of those
+        # that have been aligned to the word
+        self._all_features = frozenset(features)
         self._features = {}
 
+        # A frozen FeatureGroup is shared by snapshots and is never written;
+        # a FeatureGroup created by a snapshot shares its Features, and owns
+        # (and so can write) only the Features in _owned_features, or all of
+        # its Features if _owned_features is None
+        self._frozen = False
+        self._owned_features = None
+
+        # The gamma and the most recent denominator, keyed by (decay, time);
+        # both are invalidated when an alignment is added to a Feature
+        self._cached_gamma = None
+        self._cached_denom_key = None
+        self._cached_denom = None
+        self._cache_hits = 0
+        self._cache_misses = 0
+
     def __contains__(self, feature):
         """Check if feature is a member of this FeatureGroup."""
-        return any([f == feature for f in self._features])
+        return feature in self._all_features
 
     def __deepcopy__(self, memo):
         c = self.__class__
         result = c.__new__(c)
         memo[id(self)] = result
-        for k, v in self.__dict__.items():
-            setattr(result, k, copy.deepcopy(v, memo))
+        for k in self.__slots__:
+            setattr(result, k, getattr(self, k))
 
-        # Manually copy over the Feature dictionary, since the
-        # Features are mutable objects that themselves need to be copied
-        for feature, feature_object in result._features.items():
-            result._features[feature] = copy.deepcopy(feature_object)
+        result._features = dict(
+            (feature, feature_object.__deepcopy__(memo)) for
+            feature, feature_object in self._features.items())
+        result._frozen = False
+        result._owned_features = None
 
         return result
 
@@ -202,7 +318,7 @@ class FeatureGroup(object):
         return self._name == other._name
 
     def __len__(self):
-        return len(self._features)
+        return len(self._all_features)
 
     def __repr__(self):
         prefix = "Feature group %s" % self._name if self._name is not None \
@@ -215,30 +331,75 @@ class FeatureGroup(object):
         """
         TODO
         """
-        assert isinstance(feature, basestring)
-        assert feature not in self._features
-        self._features[feature] = Feature(feature, self._decay, self._feature_weight)
+        assert feature not in self._all_features
+        self._all_features = self._all_features | frozenset([feature])
 
     def association(self, feature, decay, time):
         """
         TODO
         """
+        if feature not in self._features:
+            if feature not in self._all_features:
+                raise UndefinedFeatureError(feature)
+            return 0.0
         return self._features[feature].association(decay, time)
 
+    def aligned_features(self):
+        """
+        Return a list of the features in this FeatureGroup that have been
+        aligned to the word at least once.
+        """
+        return [feature for feature, feature_object in self._features.items()
+                if feature_object._alignments._times is not None]
+
     def decay(self):
         """Return the p parameter for this FeatureGroup."""
         return self._decay
 
+    def cache_denom(self, decay, time, denom):
+        """Cache denom as the denominator for this FeatureGroup at time."""
+        self._cached_denom_key = (decay, time)
+        self._cached_denom = denom
+
+    def cache_statistics(self):
+        """
+        Return the (hits, misses) of the gamma and denominator cache of this
+        FeatureGroup.
+        """
+        return self._cache_hits, self._cache_misses
+
+    def cached_denom(self, decay, time):
+        """
+        Return the cached denominator for this FeatureGroup at time, or None
+        if it is not cached.
+        """
+        if self._cached_denom_key == (decay, time):
+            self._cache_hits += 1
+            return self._cached_denom
+        self._cache_misses += 1
+        return None
+
     def denom(self, decay, time):
         """Return the denominator for this FeatureGroup."""
-        return self.summed_association(decay, time) + self.k() * self.gamma()
+        denom = self.cached_denom(decay, time)
+        if denom is None:
+            denom = self.summed_association(decay, time) + \
+                self.k() * self.gamma()
+            self.cache_denom(decay, time, denom)
+        return denom
 
     def gamma(self):
         """Return the gamma parameter for this FeatureGroup."""
+        if self._cached_gamma is not None:
+            self._cache_hits += 1
+            return self._cached_gamma
+        self._cache_misses += 1
+
         num_types = len([f for f in self._features.values()
-                         if f._alignments.alignments()])
+                         if f._alignments._times is not None])
         num_types = max(num_types, 1)
-        return self._gamma * (num_types ** self.p())
+        self._cached_gamma = self._gamma * (num_types ** self.p())
+        return self._cached_gamma
 
     def k(self):
         """Return the k parameter for this FeatureGroup."""
@@ -251,18 +412,57 @@ class FeatureGroup(object):
     def prob(self, feature, decay, time):
         """Return the meaning probability of feature."""
 
-        try:
-            numer = self._features[feature].association(decay, time)
-            numer += self.gamma()
+        numer = self.association(feature, decay, time)
+        numer += self.gamma()
 
-            return numer / self.denom(decay, time)
+        return numer / self.denom(decay, time)
 
-        except KeyError:
-            raise UndefinedFeatureError
+    def probs(self, features, decay, time):
+        """
+        Return an array of the meaning probabilities of features.
+
+        The denominator and gamma of this FeatureGroup are computed once and
+        shared across all of features.
+        """
+        if not all(feature in self._all_features for feature in features):
+            raise UndefinedFeatureError(features)
+        return batch_probs(features, [self] * len(features), decay, time)
 
     def seen_features(self):
         """Return the set of all the features seen in this FeatureGroup."""
-        return set(self._features.keys())
+        return set(self._all_features)
+
+    def snapshot(self):
+        """
+        Return a copy of this FeatureGroup that shares its Features with this
+        FeatureGroup, which is frozen; a Feature is copied the first time the
+        copy writes to it.
+        """
+        self._frozen = True
+
+        c = self.__class__
+        result = c.__new__(c)
+        for k in self.__slots__:
+            setattr(result, k, getattr(self, k))
+        result._features = self._features.copy()
+        result._frozen = False
+        result._owned_features = set()
+
+        return result
+
+    def reparameterized(self, gamma, k, p):
+        """
+        Return a snapshot of this FeatureGroup (see snapshot) with the
+        parameters gamma, k and p.
+        """
+        result = self.snapshot()
+        result._gamma = gamma
+        result._k = k
+        result._p = p
+        result._cached_gamma = None
+        result._cached_denom_key = None
+        result._cached_denom = None
+        return result
 
     def summed_association(self, decay, time):
         """
@@ -282,19 +482,54 @@ class FeatureGroup(object):
         """
         TODO
         """
-        f = self._features[feature]
+        assert not self._frozen
+
+        f = self._features.get(feature)
+
+        # Create the Feature when it is first aligned to the word
+        if f is None:
+            if feature not in self._all_features:
+                raise UndefinedFeatureError(feature)
+            if not alignment > 0:
+                return
+            f = Feature(feature, self._decay, self._feature_weight)
+            self._features[feature] = f
+            if self._owned_features is not None:
+                self._owned_features.add(feature)
+
+        # Copy a Feature shared with another FeatureGroup before writing to it
+        elif self._owned_features is not None and \
+                feature not in self._owned_features:
+            f = copy.deepcopy(f)
+            self._features[feature] = f
+            self._owned_features.add(feature)
 
         ## TODO: hack - decay parameter is gamma
         #f._decay = self.gamma()
 
         f.update_association(decay, time, alignment=alignment)
 
+        if alignment > 0:
+            self._cached_gamma = None
+            self._cached_denom_key = None
 
-class Meaning(object):
-    """Contains the probability of all feature events, conditional upon a word.
+
+class MeaningSchema(object):
+    """The feature space of the Meanings of a Lexicon.
+
+    A MeaningSchema is built once per Lexicon, is shared by all of its
+    Meanings, and is never modified.
 
     Members:
-        TODO
+        feature_group_to_level_map -- a dict of (feature group -> hierarchy
+            level)
+        feature_to_feature_group_map -- a dict of (feature -> feature group)
+        feature_group_features -- a dict of (feature group -> frozenset of
+            its features)
+        feature_group_params -- a dict of (feature group -> (gamma, k, p,
+            decay, feature weight))
+        level_params -- a dict of (hierarchy level -> (gamma, k, p, decay,
+            feature weight))
     """
 
     def __init__(
@@ -306,80 +541,112 @@ class Meaning(object):
         feature_weight_sup, feature_weight_basic, feature_weight_sub, feature_weight_instance,
         feature_group_to_level_map,
         feature_to_feature_group_map,
-        word=None
     ):
+        self.feature_group_to_level_map = feature_group_to_level_map
+        self.feature_to_feature_group_map = feature_to_feature_group_map
+
+        self.level_params = level_params = {
+            'superordinate': (gamma_sup, k_sup, p_sup, decay_sup,
+                              feature_weight_sup),
+            'basic-level': (gamma_basic, k_basic, p_basic, decay_basic,
+                            feature_weight_basic),
+            'subordinate': (gamma_sub, k_sub, p_sub, decay_sub,
+                            feature_weight_sub),
+            'instance': (gamma_instance, k_instance, p_instance,
+                         decay_instance, feature_weight_instance),
+        }
+
+        feature_group_features = {}
+        for feature, feature_group in feature_to_feature_group_map.items():
+            feature_group_features.setdefault(feature_group, set()).add(feature)
+
+        self.feature_group_features = {}
+        self.feature_group_params = {}
+        for feature_group, features in feature_group_features.items():
+            level = feature_group_to_level_map[feature_group]
+            if level not in level_params:
+                raise NotImplementedError
+            self.feature_group_features[feature_group] = frozenset(features)
+            self.feature_group_params[feature_group] = level_params[level]
+
+    def feature_groups(self):
+        """Return a list of the names of the feature groups."""
+        return list(self.feature_group_features.keys())
+
+    def reparameterized(
+        self,
+        gamma_sup, gamma_basic, gamma_sub, gamma_instance,
+        k_sup, k_basic, k_sub, k_instance,
+        p_sup, p_basic, p_sub, p_instance,
+    ):
+        """
+        Return a MeaningSchema of the same feature space, with the gamma, k
+        and p parameters given, and the decay and feature weight parameters
+        of this MeaningSchema.
+        """
+        decays, feature_weights = {}, {}
+        for level, params in self.level_params.items():
+            decays[level], feature_weights[level] = params[3:]
+        return MeaningSchema(
+            gamma_sup, gamma_basic, gamma_sub, gamma_instance,
+            k_sup, k_basic, k_sub, k_instance,
+            p_sup, p_basic, p_sub, p_instance,
+            decays['superordinate'], decays['basic-level'],
+            decays['subordinate'], decays['instance'],
+            feature_weights['superordinate'], feature_weights['basic-level'],
+            feature_weights['subordinate'], feature_weights['instance'],
+            self.feature_group_to_level_map,
+            self.feature_to_feature_group_map,
+        )
+
+    def new_feature_group(self, feature_group):
+        """Return a new FeatureGroup for feature_group, with no alignments."""
+        gamma, k, p, decay, feature_weight = \
+            self.feature_group_params[feature_group]
+        return FeatureGroup(gamma, k, p, decay, feature_weight,
+                            name=feature_group,
+                            features=self.feature_group_features[feature_group])
+
+
+class Meaning(object):
+    """Contains the probability of all feature events, conditional upon a word.
+
+    A FeatureGroup is created when it is first used, so that a new Meaning
+    is cheap to create.
+
+    Members:
+        TODO
+    """
+    __slots__ = ('_word', '_seen_features', '_schema', '_feature_groups',
+                 '_frozen')
+
+    def __init__(self, schema, word=None):
         self._word = word
         self._seen_features = []
 
-        # (str) -> (str) maps
-        self._feature_group_to_level_map = feature_group_to_level_map.copy()
-        self._feature_to_feature_group_map = \
-            feature_to_feature_group_map.copy()
+        # A frozen Meaning is shared by snapshots and is never written
+        self._frozen = False
 
-        # Transform the mapping of features to group (str -> str) to be (str ->
-        # FeatureGroup)
-        self._feature_groups = {}
-        for feature, feature_group in \
-                self._feature_to_feature_group_map.items():
+        # The MeaningSchema, which is shared with every other Meaning of the
+        # Lexicon
+        self._schema = schema
 
-            try:
-                # Hash to check if the FeatureGroup has already been created
-                feature_group_object = self._feature_groups[feature_group]
-
-            except KeyError:
-                # Create the FeatureGroup object
-                level = self._feature_group_to_level_map[feature_group]
-
-                if level == 'superordinate':
-                    gamma = gamma_sup
-                    k = k_sup
-                    p = p_sup
-                    decay = decay_sup
-                    feature_weight = feature_weight_sup
-                elif level == 'basic-level':
-                    gamma = gamma_basic
-                    k = k_basic
-                    p = p_basic
-                    decay = decay_basic
-                    feature_weight = feature_weight_basic
-                elif level == 'subordinate':
-                    gamma = gamma_sub
-                    k = k_sub
-                    p = p_sub
-                    decay = decay_sub
-                    feature_weight = feature_weight_sub
-                elif level == 'instance':
-                    gamma = gamma_instance
-                    k = k_instance
-                    p = p_instance
-                    decay = decay_instance
-                    feature_weight = feature_weight_instance
-                else:
-                    raise NotImplementedError
-
-                feature_group_object = FeatureGroup(gamma, k, p, decay,
-                                                    feature_weight,
-                                                    name=feature_group)
-
-                self._feature_groups[feature_group] = feature_group_object
-
-            feature_group_object.add_feature(feature)
-            self._feature_to_feature_group_map[feature] = feature_group_object
+        # The FeatureGroups created so far
+        self._feature_groups = {}
 
     def __deepcopy__(self, memo):
         c = self.__class__
         result = c.__new__(c)
         memo[id(self)] = result
-        for k, v in self.__dict__.items():
-            setattr(result, k, copy.deepcopy(v, memo))
+        for k in self.__slots__:
+            setattr(result, k, getattr(self, k))
 
-        # Manually copy over the FeatureGroup dictionaries, since the
-        # FeatureGroups are mutable object that themselves need to be copied
-        for feature_group, feature_group_object in result._feature_groups.items():
-            result._feature_groups[feature_group] = copy.deepcopy(feature_group_object)
-        for feature, old_feature_group_object in result._feature_to_feature_group_map.items():
-            result._feature_to_feature_group_map[feature] =\
-                result._feature_groups[old_feature_group_object._name]
+        result._seen_features = list(self._seen_features)
+        result._feature_groups = dict(
+            (feature_group, copy.deepcopy(feature_group_object, memo)) for
+            feature_group, feature_group_object in
+            self._feature_groups.items())
+        result._frozen = False
 
         return result
 
@@ -393,6 +660,7 @@ class Meaning(object):
         Add to the list of features encountered so far with the word associated
         with this Meaning.
         """
+        assert not self._frozen
         self._seen_features.extend(features[:])
         self._seen_features = list(set(self._seen_features))  # no duplicates
 
@@ -406,37 +674,84 @@ class Meaning(object):
 
     def feature_group(self, feature_group_name):
         """
-        TODO
+        Return the FeatureGroup feature_group_name, first creating it if it
+        has not been used yet. The new FeatureGroup of a frozen Meaning is not
+        stored, since a frozen Meaning is never written.
         """
-        return self._feature_groups[feature_group_name]
+        try:
+            return self._feature_groups[feature_group_name]
+        except KeyError:
+            feature_group = self._schema.new_feature_group(feature_group_name)
+            if not self._frozen:
+                self._feature_groups[feature_group_name] = feature_group
+            return feature_group
+
+    def feature_group_of(self, feature):
+        """Return the FeatureGroup containing feature."""
+        return self.feature_group(
+            self._schema.feature_to_feature_group_map[feature])
 
     def feature_groups(self):
         """
         Return a list of the FeatureGroups that are contained within this
         Meaning.
         """
-        return list(self._feature_groups.values())
+        return [self.feature_group(feature_group_name) for feature_group_name
+                in self._schema.feature_groups()]
+
+    def cache_statistics(self):
+        """
+        Return the (hits, misses) of the gamma and denominator caches of the
+        FeatureGroups in this Meaning.
+        """
+        hits = 0
+        misses = 0
+        for feature_group in self._feature_groups.values():
+            group_hits, group_misses = feature_group.cache_statistics()
+            hits += group_hits
+            misses += group_misses
+        return hits, misses
 
     def decay(self, feature):
         """Return the decay parameter for feature in this Meaning."""
-        feature_group = self._feature_to_feature_group_map[feature]
+        feature_group = self.feature_group_of(feature)
         return feature_group.decay()
 
     def gamma(self, feature):
         """Return the gamma parameter for feature in this Meaning."""
-        feature_group = self._feature_to_feature_group_map[feature]
+        feature_group = self.feature_group_of(feature)
         return feature_group.gamma()
 
     def k(self, feature):
         """Return the k parameter for feature in this Meaning."""
-        feature_group = self._feature_to_feature_group_map[feature]
+        feature_group = self.feature_group_of(feature)
         return feature_group.k()
 
     def prob(self, feature, decay, time):
         """Return the probability of feature given this Meaning's word."""
-        feature_group = self._feature_to_feature_group_map[feature]
+        feature_group = self.feature_group_of(feature)
         return feature_group.prob(feature, decay, time)
 
+    def probs(self, features, decay, time):
+        """
+        Return an array of the probabilities of features given this Meaning's
+        word, computed in one batch across all of their FeatureGroups.
+        """
+        return batch_probs(features,
+                           [self.feature_group_of(feature) for feature in
+                            features],
+                           decay, time)
+
+    def probs_at_times(self, features, decay, times):
+        """
+        Return a (times x features) array of the probabilities of features
+        given this Meaning's word, at each of times.
+        """
+        return batch_probs_at_times(features,
+                                    [self.feature_group_of(feature) for
+                                     feature in features],
+                                    decay, times)
+
     def seen_features(self):
         """
         Return a set of all features from all levels of the hierarchy, observed
@@ -444,12 +759,47 @@ class Meaning(object):
         """
         return set(self._seen_features)
 
+    def snapshot(self, word=None):
+        """
+        Return a copy of this Meaning (for word, if word is not None) that
+        shares its FeatureGroups with this Meaning. The shared FeatureGroups
+        are frozen, and each is copied the first time either Meaning writes
+        to it.
+        """
+        c = self.__class__
+        result = c.__new__(c)
+        for k in self.__slots__:
+            setattr(result, k, getattr(self, k))
+
+        result._word = self._word if word is None else word
+        result._seen_features = list(self._seen_features)
+        result._feature_groups = self._feature_groups.copy()
+        result._frozen = False
+
+        for feature_group in self._feature_groups.values():
+            feature_group._frozen = True
+
+        return result
+
+    def reparameterized(self, schema):
+        """
+        Return a snapshot of this Meaning (see snapshot) in the MeaningSchema
+        schema, a reparameterization of the MeaningSchema of this Meaning.
+        """
+        result = self.snapshot()
+        result._schema = schema
+        result._feature_groups = dict(
+            (name, feature_group.reparameterized(
+                *schema.feature_group_params[name][:3]))
+            for name, feature_group in self._feature_groups.items())
+        return result
+
     def summed_association(self, feature, decay, time):
         """
         Return the association, summed across the FeatureGroup containing
         feature, for feature in this Meaning.
         """
-        feature_group = self._feature_to_feature_group_map[feature]
+        feature_group = self.feature_group_of(feature)
         return feature_group.summed_association(decay, time)
 
     def update_association(self, feature, alignment, decay, time):
@@ -457,8 +807,216 @@ class Meaning(object):
         Update the association between this Meaning's word and feature by
         adding alignment to the current association.
         """
-        self._feature_to_feature_group_map[feature].\
-            update_association(feature, alignment, decay, time)
+        assert not self._frozen
+
+        feature_group = self.feature_group_of(feature)
+
+        # Copy a FeatureGroup shared with a snapshot before writing to it
+        if feature_group._frozen:
+            feature_group = feature_group.snapshot()
+            self._feature_groups[feature_group._name] = feature_group
+
+        feature_group.update_association(feature, alignment, decay, time)
+
+    def update_associations(self, features, alignments, decay, time):
+        """
+        Update the associations between this Meaning's word and each of
+        features by adding the corresponding alignment of alignments.
+        """
+        assert not self._frozen
+
+        # Group the updates by FeatureGroup
+        updates = {}
+        for feature, alignment in zip(features, alignments):
+            name = self._schema.feature_to_feature_group_map[feature]
+            updates.setdefault(name, []).append((feature, alignment))
+
+        for name, group_updates in updates.items():
+            feature_group = self.feature_group(name)
+
+            # Copy a FeatureGroup shared with a snapshot before writing to it
+            if feature_group._frozen:
+                feature_group = feature_group.snapshot()
+                self._feature_groups[name] = feature_group
+
+            for feature, alignment in group_updates:
+                feature_group.update_association(feature, alignment, decay,
+                                                 time)
+
+
+def bincount_rows(index, weights, minlength):
+    """
+    Return a (rows x minlength) array of the sums of each row of the 2-D array
+    weights, binned by index, in one call to np.bincount.
+    """
+    num_rows = weights.shape[0]
+    offsets = np.arange(num_rows)[:, np.newaxis] * minlength
+    return np.bincount((np.asarray(index, dtype=int) + offsets).ravel(),
+                       weights=weights.ravel(),
+                       minlength=num_rows * minlength).reshape(num_rows,
+                                                               minlength)
+
+
+def decayed_associations(feature_objects, times):
+    """
+    Return a (times x feature_objects) array of the decayed associations (see
+    Alignments.decayed_sum) of the Features feature_objects at each of times.
+
+    The decay term of every alignment is computed for all of times in one
+    array expression.
+    """
+    index = []
+    alignment_times = []
+    weighted_alignments = []
+    multiplicities = []
+    decays = []
+    for i, feature_object in enumerate(feature_objects):
+        for t, a, multiplicity in \
+                feature_object._alignments.weighted_alignments():
+            index.append(i)
+            alignment_times.append(t)
+            weighted_alignments.append(a)
+            multiplicities.append(multiplicity)
+            decays.append(feature_object._decay)
+
+    times = np.asarray(times)
+    a = np.array(weighted_alignments, dtype=float)
+    with np.errstate(over='ignore'):
+        decayed = np.array(multiplicities) * a / \
+            np.power(times[:, np.newaxis] - np.array(alignment_times, dtype=int)
+                     + 1, np.array(decays) / a)
+
+    return bincount_rows(index, decayed, len(feature_objects))
+
+
+def batch_probs(features, feature_groups, decay, time):
+    """
+    Return an array of the meaning probabilities of features, where
+    feature_groups[i] is the FeatureGroup containing features[i].
+
+    The associations of all the features with alignments in any of
+    feature_groups are computed in one array expression, and the denominator
+    and gamma of each FeatureGroup are computed once.
+    """
+    # Enumerate the distinct FeatureGroups and their features with alignments
+    # (only these have a nonzero association)
+    group_positions = {}
+    groups = []
+    for feature_group in feature_groups:
+        if id(feature_group) not in group_positions:
+            group_positions[id(feature_group)] = len(groups)
+            groups.append(feature_group)
+
+    # The associations of all the features with alignments are needed for a
+    # FeatureGroup whose denominator is not cached; otherwise, only those of
+    # the features themselves
+    cached_denoms = [feature_group.cached_denom(decay, time) for
+                     feature_group in groups]
+
+    aligned_features = []
+    aligned_groups = []
+    feature_positions = {}
+    for j, feature_group in enumerate(groups):
+        if cached_denoms[j] is None:
+            for feature in feature_group.aligned_features():
+                feature_object = feature_group._features[feature]
+                feature_positions[id(feature_object)] = len(aligned_features)
+                aligned_features.append(feature_object)
+                aligned_groups.append(j)
+    for feature, feature_group in zip(features, feature_groups):
+        feature_object = feature_group._features.get(feature)
+        if feature_object is not None and \
+                id(feature_object) not in feature_positions and \
+                feature_object._alignments._times is not None:
+            feature_positions[id(feature_object)] = len(aligned_features)
+            aligned_features.append(feature_object)
+            aligned_groups.append(group_positions[id(feature_group)])
+
+    # Compute the association of each feature with alignments
+    if decay:
+        associations = decayed_associations(aligned_features, [time])[0]
+
+    else:
+        associations = np.array([feature_object.association(decay, time) for
+                                 feature_object in aligned_features],
+                                dtype=float)
+
+    # Compute the denominator of each FeatureGroup that is not cached
+    gammas = np.array([feature_group.gamma() for feature_group in groups])
+    ks = np.array([feature_group.k() for feature_group in groups])
+    denoms = np.bincount(np.array(aligned_groups, dtype=int),
+                         weights=associations, minlength=len(groups)) + \
+        ks * gammas
+    for j, feature_group in enumerate(groups):
+        if cached_denoms[j] is None:
+            feature_group.cache_denom(decay, time, denoms[j])
+        else:
+            denoms[j] = cached_denoms[j]
+
+    # Look up the association of each feature, with index -1 selecting the
+    # zero association of a feature without alignments
+    index = np.array([feature_positions.get(id(feature_group._features.get(feature)), -1)
+                      for feature, feature_group in zip(features, feature_groups)],
+                     dtype=int)
+    associations = np.append(associations, 0.)
+    group_index = np.array([group_positions[id(feature_group)] for
+                            feature_group in feature_groups], dtype=int)
+
+    return (associations[index] + gammas[group_index]) / denoms[group_index]
+
+
+def batch_probs_at_times(features, feature_groups, decay, times):
+    """
+    Return a (times x features) array of the meaning probabilities of
+    features at each of times, where feature_groups[i] is the FeatureGroup
+    containing features[i].
+
+    The associations of all the features with alignments in any of
+    feature_groups are computed at all of times at once (see
+    decayed_associations); the denominators are not cached.
+    """
+    group_positions = {}
+    groups = []
+    for feature_group in feature_groups:
+        if id(feature_group) not in group_positions:
+            group_positions[id(feature_group)] = len(groups)
+            groups.append(feature_group)
+
+    aligned_features = []
+    aligned_groups = []
+    feature_positions = {}
+    for j, feature_group in enumerate(groups):
+        for feature in feature_group.aligned_features():
+            feature_object = feature_group._features[feature]
+            feature_positions[id(feature_object)] = len(aligned_features)
+            aligned_features.append(feature_object)
+            aligned_groups.append(j)
+
+    # Compute the association of each feature with alignments at each time;
+    # without decay, the associations do not change with time
+    if decay:
+        associations = decayed_associations(aligned_features, times)
+    else:
+        associations = np.tile(
+            np.array([feature_object.association(decay, times[0]) for
+                      feature_object in aligned_features], dtype=float),
+            (len(times), 1))
+
+    # Compute the denominator of each FeatureGroup at each time
+    gammas = np.array([feature_group.gamma() for feature_group in groups])
+    ks = np.array([feature_group.k() for feature_group in groups])
+    denoms = bincount_rows(aligned_groups, associations, len(groups)) + \
+        ks * gammas
+
+    index = np.array([feature_positions.get(id(feature_group._features.get(feature)), -1)
+                      for feature, feature_group in zip(features, feature_groups)],
+                     dtype=int)
+    associations = np.append(associations, np.zeros((len(times), 1)), axis=1)
+    group_index = np.array([group_positions[id(feature_group)] for
+                            feature_group in feature_groups], dtype=int)
+
+    return (associations[:, index] + gammas[group_index]) / \
+        denoms[:, group_index]
 
 
 class Lexicon(object):
@@ -482,76 +1040,77 @@ class Lexicon(object):
         """
         TODO
         """
-        self._gamma_sup = gamma_sup
-        self._gamma_basic = gamma_basic
-        self._gamma_sub = gamma_sub
-        self._gamma_instance = gamma_instance
-
-        self._k_sup = k_sup
-        self._k_basic = k_basic
-        self._k_sub = k_sub
-        self._k_instance = k_instance
-
-        self._p_sup = p_sup
-        self._p_basic = p_basic
-        self._p_sub = p_sub
-        self._p_instance = p_instance
-
-        self._decay_sup = decay_sup
-        self._decay_basic = decay_basic
-        self._decay_sub = decay_sub
-        self._decay_instance = decay_instance
-
-        self._feature_weight_sup = feature_weight_sup
-        self._feature_weight_basic = feature_weight_basic
-        self._feature_weight_sub = feature_weight_sub
-        self._feature_weight_instance = feature_weight_instance
-
         self.feature_group_to_level_map = feature_group_to_level_map
         self.feature_to_feature_group_map = feature_to_feature_group_map
 
+        # The feature space, which is shared by all of the Meanings
+        self._schema = MeaningSchema(
+            gamma_sup, gamma_basic, gamma_sub, gamma_instance,
+            k_sup, k_basic, k_sub, k_instance,
+            p_sup, p_basic, p_sub, p_instance,
+            decay_sup, decay_basic, decay_sub, decay_instance,
+            feature_weight_sup, feature_weight_basic, feature_weight_sub,
+            feature_weight_instance,
+            feature_group_to_level_map,
+            feature_to_feature_group_map,
+        )
+
         self._word_meanings = {}
         for word in words:
             self.initialize_new_meaning(word)
 
+    def __deepcopy__(self, memo):
+        c = self.__class__
+        result = c.__new__(c)
+        memo[id(self)] = result
+        result.__dict__.update(self.__dict__)
+
+        # The schema and the feature maps are only read, so they are shared
+        # with the copy
+        result._word_meanings = dict(
+            (word, copy.deepcopy(meaning, memo)) for word, meaning in
+            self._word_meanings.items())
+
+        return result
+
     def initialize_new_meaning(self, word):
         """
         TODO
         """
         assert word not in self._word_meanings
-        self._word_meanings[word] = Meaning(
-            self._gamma_sup,
-            self._gamma_basic,
-            self._gamma_sub,
-            self._gamma_instance,
-            self._k_sup,
-            self._k_basic,
-            self._k_sub,
-            self._k_instance,
-            self._p_sup,
-            self._p_basic,
-            self._p_sub,
-            self._p_instance,
-            self._decay_sup,
-            self._decay_basic,
-            self._decay_sub,
-            self._decay_instance,
-            self._feature_weight_sup,
-            self._feature_weight_basic,
-            self._feature_weight_sub,
-            self._feature_weight_instance,
-            self.feature_group_to_level_map,
-            self.feature_to_feature_group_map,
-            word=word
-        )
+        self._word_meanings[word] = Meaning(self._schema, word=word)
         return self._word_meanings[word]
 
+    def _writable_meaning(self, word):
+        """
+        Return the Meaning of word, first copying it if it is shared with a
+        snapshot of this Lexicon.
+        """
+        meaning = self.meaning(word)
+        if meaning._frozen:
+            meaning = meaning.snapshot()
+            self._word_meanings[word] = meaning
+        return meaning
+
     def add_seen_features(self, word, features):
         """
         Add features to the list of features encountered so far with word.
         """
         assert word in self._word_meanings
-        self._word_meanings[word].add_seen_features(features)
+        self._writable_meaning(word).add_seen_features(features)
+
+    def cache_statistics(self):
+        """
+        Return the (hits, misses) of the gamma and denominator caches of the
+        FeatureGroups in this Lexicon.
+        """
+        hits = 0
+        misses = 0
+        for meaning in self._word_meanings.values():
+            meaning_hits, meaning_misses = meaning.cache_statistics()
+            hits += meaning_hits
+            misses += meaning_misses
+        return hits, misses
 
     def gamma(self, word, feature):
         """
@@ -589,21 +1148,95 @@ class Lexicon(object):
             self.initialize_new_meaning(word)
         return self._word_meanings[word].prob(feature, decay, time)
 
+    def probs(self, word, features, decay, time):
+        """
+        Return an array of the probabilities of each of features being part of
+        the meaning of word.
+        """
+        if word not in self._word_meanings:
+            self.initialize_new_meaning(word)
+        return self._word_meanings[word].probs(features, decay, time)
+
+    def probs_at_times(self, word, features, decay, times):
+        """
+        Return a (times x features) array of the probabilities of each of
+        features being part of the meaning of word, at each of times.
+        """
+        if word not in self._word_meanings:
+            self.initialize_new_meaning(word)
+        return self._word_meanings[word].probs_at_times(features, decay,
+                                                        times)
+
+    def reparameterized(
+        self,
+        gamma_sup, gamma_basic, gamma_sub, gamma_instance,
+        k_sup, k_basic, k_sub, k_instance,
+        p_sup, p_basic, p_sub, p_instance,
+    ):
+        """
+        Return a snapshot of this Lexicon (see snapshot) with the gamma, k
+        and p parameters given; the associations learned so far are kept, as
+        they are stored independently of these parameters.
+        """
+        schema = self._schema.reparameterized(
+            gamma_sup, gamma_basic, gamma_sub, gamma_instance,
+            k_sup, k_basic, k_sub, k_instance,
+            p_sup, p_basic, p_sub, p_instance,
+        )
+
+        result = copy.copy(self)
+        result._schema = schema
+        result._word_meanings = dict(
+            (word, meaning.reparameterized(schema)) for word, meaning in
+            self._word_meanings.items())
+
+        return result
+
     def seen_features(self, word):
         """Return the set of features encountered so far with word."""
         if word in self._word_meanings:
             return self._word_meanings[word].seen_features()
         return set()
 
+    def snapshot(self, words=None):
+        """
+        Return a copy of this Lexicon that shares its Meanings with this
+        Lexicon. The shared Meanings are frozen, and each is copied the first
+        time either Lexicon writes to it, so that a snapshot costs time in the
+        number of words, and the state that is written afterwards.
+
+        If words is not None, the copy contains only the Meanings of those of
+        words that are in this Lexicon.
+        """
+        if words is None:
+            words = self._word_meanings.keys()
+
+        result = copy.copy(self)
+        result._word_meanings = {}
+
+        for word in words:
+            if word in self._word_meanings:
+                meaning = self._word_meanings[word]
+                meaning._frozen = True
+                result._word_meanings[word] = meaning
+
+        return result
+
     def update_association(self, word, feature, alignment, decay, time):
         """
         Update association between word and feature by adding alignment to
         the current association.
         """
-        if word not in self._word_meanings:
-            self.initialize_new_meaning(word)
-        self._word_meanings[word].update_association(feature, alignment,
-                                                     decay, time)
+        self._writable_meaning(word).update_association(feature, alignment,
+                                                        decay, time)
+
+    def update_associations(self, word, features, alignments, decay, time):
+        """
+        Update the associations between word and each of features by adding
+        the corresponding alignment of alignments.
+        """
+        self._writable_meaning(word).update_associations(features, alignments,
+                                                         decay, time)
 
     def words(self):
         """Return a set of all words in this Lexicon."""
@@ -11,6 +11,8 @@ import re
 import os
 import sys
 
+from novel_word_generalization.core import feature_space
+
 
 def generate_simple_data(data_path):
 
@@ -852,6 +854,19 @@ def generate_xt_data(data_path):
                    'w'), indent=4, separators=(',', ': '), sort_keys=True)
 
 
+def compile_feature_spaces(data_path):
+    """
+    Compile each feature space in data_path into the binary format read by
+    the experiments (see core/feature_space.py).
+    """
+    for name in sorted(os.listdir(data_path)):
+        directory = os.path.join(data_path, name)
+        if os.path.exists(os.path.join(directory,
+                                       feature_space.STIMULI_FILE)):
+            logging.info("Compiling %s",
+                         feature_space.compile_feature_space(directory))
+
+
 def parse_args(args):
     parser = ArgumentParser()
 
@@ -865,6 +880,10 @@ def parse_args(args):
                         default=os.path.dirname(os.path.realpath(__file__)),
                         help='The path to which to write the data')
 
+    parser.add_argument('--compile_only', action='store_true',
+                        help='Only compile the existing feature spaces in '
+                             'data_path, without regenerating them')
+
     return parser.parse_args(args)
 
 
@@ -877,10 +896,13 @@ def main(args=sys.argv[1:]):
     if not os.path.exists(args.data_path):
         os.mkdir(args.data_path)
 
-    generate_simple_data(args.data_path)
-    generate_grid_simple_data(args.data_path)
-    generate_category_data(args.data_path)
-    generate_xt_data(args.data_path)
+    if not args.compile_only:
+        generate_simple_data(args.data_path)
+        generate_grid_simple_data(args.data_path)
+        generate_category_data(args.data_path)
+        generate_xt_data(args.data_path)
+
+    compile_feature_spaces(args.data_path)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,422 @@
+#!/usr/bin/python
+
+
+from __future__ import print_function, division
+
+
+from argparse import ArgumentParser
+import array
+from ConfigParser import ConfigParser
+import gzip
+import importlib
+import json
+import logging
+import numpy as np
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+from novel_word_generalization.core import input
+from novel_word_generalization.core import learn
+from novel_word_generalization.core import symbols
+from novel_word_generalization.core import wmmapping
+
+import conduct_generalization_experiments
+import config
+import generalization_experiment
+
+
+"""
+benchmarks.py
+
+Benchmarks of the core data structures of the word learner; run a benchmark
+by name (see the -h option for the list of benchmarks):
+
+python benchmarks.py BENCHMARK
+
+"""
+
+
+def naive_decayed_association(alignments, decay, time):
+    """
+    Return the decayed association of the (time, alignment) pairs in
+    alignments, computed by rescanning the whole history for every pair.
+
+    This is a reference implementation of the decayed association as it was
+    computed before the per-time aggregates of wmmapping.Alignments.
+    """
+    association = 0
+    for (t, align) in alignments:
+        count = len([1 for a in alignments if a[0] == t])
+        a = align * (count / len(alignments))
+        association += a / np.power(time - t + 1, (decay / a))
+    return association
+
+
+def training_schedule(num_trials, scene_size, spacing):
+    """
+    Return a list of (time, alignment) pairs for a feature that is presented
+    scene_size times per trial, for num_trials trials spaced spacing time
+    steps apart.
+    """
+    schedule = []
+    for trial in range(num_trials):
+        for i in range(scene_size):
+            schedule.append((1 + trial * spacing, 1.))
+    return schedule
+
+
+def benchmark_association(lengths=(25, 50, 100, 200), scene_size=2,
+                          spacing=3, reads_per_trial=10, decay=0.5):
+    """
+    Time the training of a Feature on long schedules, reading its decayed
+    association reads_per_trial times after every alignment (as the Learner
+    does when computing the denominators of the meaning probabilities),
+    against the naive rescanning computation.
+    """
+    print("alignments", "naive (s)", "incremental (s)", "speedup",
+          "max rel. error", sep='\t')
+
+    for num_trials in lengths:
+        schedule = training_schedule(num_trials, scene_size, spacing)
+
+        def naive():
+            associations = []
+            for i, (t, align) in enumerate(schedule):
+                for _ in range(reads_per_trial):
+                    association = \
+                        naive_decayed_association(schedule[:i+1], decay, t)
+                associations.append(association)
+            return associations
+
+        def incremental():
+            associations = []
+            feature = wmmapping.Feature('feature', decay, 1.)
+            for (t, align) in schedule:
+                feature.update_association(True, t, alignment=align)
+                for _ in range(reads_per_trial):
+                    association = feature.association(True, t)
+                associations.append(association)
+            return associations
+
+        naive_time = timeit.timeit(naive, number=1)
+        incremental_time = timeit.timeit(incremental, number=1)
+
+        expected = np.array(naive())
+        actual = np.array(incremental())
+        error = np.max(np.abs(expected - actual) / np.abs(expected))
+
+        print(len(schedule), "%.4f" % naive_time, "%.4f" % incremental_time,
+              "%.1fx" % (naive_time / incremental_time), "%.2e" % error,
+              sep='\t')
+
+
+def load_feature_space(feature_space, data_path):
+    """
+    Return the stimuli, the feature group -> level map and the feature ->
+    feature group map of feature_space.
+    """
+    with open(os.path.join(data_path, generalization_experiment.stimuli_files[feature_space])) as f:
+        stimuli = json.load(f)
+    with open(os.path.join(data_path, generalization_experiment.feature_group_to_level_maps[feature_space])) as f:
+        feature_group_to_level_map = json.load(f)
+    with open(os.path.join(data_path, generalization_experiment.feature_to_feature_group_maps[feature_space])) as f:
+        feature_to_feature_group_map = json.load(f)
+    return stimuli, feature_group_to_level_map, feature_to_feature_group_map
+
+
+def default_learner(feature_group_to_level_map, feature_to_feature_group_map,
+                    decay=0.5, learn_module=learn):
+    """
+    Return a Learner of learn_module with the default parameter settings of
+    exp.cfg.
+    """
+    return learn_module.Learner(
+        alpha=0., beta=0.,
+        gamma_sup=0.5, gamma_basic=0.5, gamma_sub=0.5, gamma_instance=0.5,
+        k_sup=100., k_basic=100., k_sub=100., k_instance=100.,
+        p_sup=2., p_basic=2., p_sub=2., p_instance=2.,
+        decay_sup=decay, decay_basic=decay, decay_sub=decay,
+        decay_instance=decay,
+        feature_weight_sup=1., feature_weight_basic=1., feature_weight_sub=1.,
+        feature_weight_instance=1.,
+        feature_group_to_level_map=feature_group_to_level_map,
+        feature_to_feature_group_map=feature_to_feature_group_map,
+        decay=True,
+    )
+
+
+def deep_sizeof(obj, seen=None):
+    """Return the size in bytes of obj and of all the objects it refers to."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen)
+                    for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif isinstance(obj, (basestring, array.array, np.ndarray)):
+        pass
+    else:
+        if hasattr(obj, '__dict__'):
+            size += deep_sizeof(obj.__dict__, seen)
+        for cls in type(obj).__mro__:
+            for slot in getattr(cls, '__slots__', ()):
+                if hasattr(obj, slot):
+                    size += deep_sizeof(getattr(obj, slot), seen)
+
+    return size
+
+
+# The revision of this repository whose Lexicon is measured as the baseline
+# by the memory benchmark: the layout before __slots__ and typed alignment
+# arrays
+baseline_revision = '821c7f9'
+
+
+def baseline_learn_module(revision=baseline_revision):
+    """
+    Return the learn module of revision of this repository, which imports
+    the wmmapping module of the same revision, read with git into a
+    temporary package.
+    """
+    repository_path = os.path.join(
+        os.path.dirname(os.path.realpath(__file__)), os.pardir)
+    package = 'baseline_core_' + revision
+
+    directory = tempfile.mkdtemp()
+    try:
+        os.mkdir(os.path.join(directory, package))
+        for name in ['__init__.py', 'learn.py', 'wmmapping.py']:
+            source = subprocess.check_output(
+                ['git', 'show', '%s:core/%s' % (revision, name)],
+                cwd=repository_path)
+            with open(os.path.join(directory, package, name), 'wb') as f:
+                f.write(source)
+
+        sys.path.insert(0, directory)
+        try:
+            return importlib.import_module(package + '.learn')
+        finally:
+            sys.path.remove(directory)
+    finally:
+        shutil.rmtree(directory)
+
+
+def benchmark_memory(data_path=None):
+    """
+    Report the memory used by a Lexicon trained on every training condition
+    of every feature space under data_path, with one meaning learned for each
+    training condition and one for each test scene (as for the dummy scene
+    words of the cosine metrics), by the Lexicon of this tree and by the
+    Lexicon of baseline_revision, trained identically.
+    """
+    if data_path is None:
+        data_path = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                 os.pardir, 'data')
+
+    baseline_learn = baseline_learn_module()
+
+    print("feature space", "words", "features",
+          "baseline %s (KiB)" % baseline_revision, "current (KiB)", "ratio",
+          sep='\t')
+
+    for feature_space in sorted(generalization_experiment.stimuli_files):
+        stimuli, feature_group_to_level_map, feature_to_feature_group_map =\
+            load_feature_space(feature_space, data_path)
+
+        sizes = []
+        for learn_module in [baseline_learn, learn]:
+            learner = default_learner(feature_group_to_level_map,
+                                      feature_to_feature_group_map,
+                                      learn_module=learn_module)
+
+            for training_condition, training_set in \
+                    stimuli['training set'].items():
+                for scene in training_set.values():
+                    learner.process_pair([training_condition], scene, './')
+
+            for test_condition, test_set in stimuli['test set'].items():
+                for test_object, scene in test_set.items():
+                    learner.process_pair([test_condition + test_object],
+                                         scene, './', time_increment=False)
+
+            lexicon = learner._learned_lexicon
+            sizes.append(deep_sizeof(lexicon._word_meanings) / 1024)
+
+        print(feature_space, len(lexicon._word_meanings),
+              len(feature_to_feature_group_map), "%.1f" % sizes[0],
+              "%.1f" % sizes[1], "%.2f" % (sizes[0] / sizes[1]), sep='\t')
+
+
+def benchmark_sweep(config_file=None):
+    """
+    Time the Experiments of every trial of the sweep defined in config_file
+    (by default, exp.cfg), without writing any results.
+    """
+    starter_path = os.path.dirname(os.path.realpath(__file__))
+    if config_file is None:
+        config_file = os.path.join(starter_path, 'exp.cfg')
+
+    config_parser = ConfigParser()
+    if not config_parser.read(config_file):
+        raise SystemExit('Config file %s not found.' % config_file)
+
+    paramlist = []
+    for exp in config_parser.sections():
+        params = config.items_to_params(config_parser.items(exp))
+        params['name'] = exp
+        params['data-path'] = os.path.join(starter_path, params['data-path'])
+        paramlist.append(params)
+
+    exp_list = list(
+        conduct_generalization_experiments.generate_conditions(paramlist))
+
+    stdout = sys.stdout
+    start = time.time()
+    try:
+        with open(os.devnull, 'w') as devnull:
+            sys.stdout = devnull
+            for params in exp_list:
+                generalization_experiment.Experiment(params).run()
+    finally:
+        sys.stdout = stdout
+    elapsed = time.time() - start
+
+    print("trials", "total (s)", "per trial (ms)", sep='\t')
+    print(len(exp_list), "%.2f" % elapsed,
+          "%.1f" % (1000 * elapsed / len(exp_list)), sep='\t')
+
+
+def write_corpus(corpus_path, scenes, num_utterances, vocabulary_size=1000,
+                 utterance_length=3, seed=0):
+    """
+    Write a synthetic corpus of num_utterances utterances to corpus_path (as a
+    gzip file if corpus_path ends in '.gz'), each pairing utterance_length
+    words of a vocabulary of vocabulary_size words with one of scenes.
+    """
+    rng = np.random.RandomState(seed)
+    vocabulary = ['word%d' % i for i in range(vocabulary_size)]
+
+    opener = gzip.open if corpus_path.endswith('.gz') else open
+    with opener(corpus_path, 'wb') as f:
+        for i in xrange(num_utterances):
+            words = [vocabulary[w] for w in
+                     rng.randint(vocabulary_size, size=utterance_length)]
+            scene = scenes[rng.randint(len(scenes))]
+            f.write('%d-----\n' % (i + 1))
+            f.write('SENTENCE: ' + ' '.join(words) + '\n')
+            f.write('SEM_REP: ,' + ','.join(scene) + '\n')
+
+
+def benchmark_corpus(num_utterances=(10000, 100000, 1000000),
+                     learn_utterances=1000, data_path=None):
+    """
+    Time the streaming of gzipped synthetic corpora built from the training
+    scenes of the xt-animals feature space, and the streaming of the first
+    learn_utterances utterances into a Learner, with the words and features
+    as strings and as interned ids, and report the throughput and the peak
+    memory in use.
+    """
+    if data_path is None:
+        data_path = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                 os.pardir, 'data')
+
+    stimuli, feature_group_to_level_map, feature_to_feature_group_map =\
+        load_feature_space('xt-animals', data_path)
+    scenes = [[str(feature) for feature in scene] for training_set in
+              stimuli['training set'].values() for scene in
+              training_set.values()]
+
+    print("utterances", "stage", "time (s)", "utterances/s",
+          "max RSS (MiB)", sep='\t')
+
+    directory = tempfile.mkdtemp()
+    try:
+        for n in num_utterances:
+            corpus_path = os.path.join(directory, 'corpus-%d.gz' % n)
+            write_corpus(corpus_path, scenes, n)
+
+            with input.Corpus(corpus_path) as corpus:
+                monitor = input.ThroughputMonitor(report_every=n)
+                for pair in corpus:
+                    monitor.update()
+            print(n, "read", "%.2f" % monitor.elapsed(),
+                  "%.0f" % monitor.rate(), "%.1f" % max_rss(), sep='\t')
+
+            os.remove(corpus_path)
+
+        corpus_path = os.path.join(directory, 'corpus-%d.gz' %
+                                   learn_utterances)
+        write_corpus(corpus_path, scenes, learn_utterances)
+
+        learner = default_learner(feature_group_to_level_map,
+                                  feature_to_feature_group_map)
+        monitor = learner.process_corpus(corpus_path, './',
+                                         report_every=learn_utterances)
+        print(learn_utterances, "learn", "%.2f" % monitor.elapsed(),
+              "%.0f" % monitor.rate(), "%.1f" % max_rss(), sep='\t')
+
+        (level_map, feature_group_map, features, feature_groups) =\
+            symbols.intern_feature_space(feature_group_to_level_map,
+                                         feature_to_feature_group_map)
+        learner = default_learner(level_map, feature_group_map)
+        with input.Corpus(corpus_path, word_symbols=symbols.SymbolTable(),
+                          feature_symbols=features) as corpus:
+            monitor = learner.process_corpus(None, './', corpus=corpus,
+                                             report_every=learn_utterances)
+        print(learn_utterances, "learn (ids)", "%.2f" % monitor.elapsed(),
+              "%.0f" % monitor.rate(), "%.1f" % max_rss(), sep='\t')
+
+        os.remove(corpus_path)
+    finally:
+        os.rmdir(directory)
+
+
+def max_rss():
+    """Return the peak memory in use by this process, in MiB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+benchmarks = {
+    'association': benchmark_association,
+    'corpus': benchmark_corpus,
+    'memory': benchmark_memory,
+    'sweep': benchmark_sweep,
+}
+
+
+def parse_args(args):
+    parser = ArgumentParser()
+
+    parser.add_argument('--logging', type=str, default='INFO',
+                        metavar='logging', choices=['DEBUG', 'INFO', 'WARNING',
+                                                    'ERROR', 'CRITICAL'],
+                        help='Logging level')
+
+    parser.add_argument('benchmark', metavar='benchmark', type=str,
+                        choices=sorted(benchmarks.keys()),
+                        help='The benchmark to run')
+
+    return parser.parse_args(args)
+
+
+def main(args=sys.argv[1:]):
+    args = parse_args(args)
+    logging.basicConfig(level=args.logging)
+    benchmarks[args.benchmark]()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
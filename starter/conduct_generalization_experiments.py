@@ -6,19 +6,22 @@ from __future__ import print_function, division
 
 from argparse import ArgumentParser
 from ConfigParser import ConfigParser
+import collections
 import itertools
 import logging
-import matplotlib; matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from multiprocessing import Pool
 import numpy as np
 import os
-import re
 import sys
 import types
 
 
+from novel_word_generalization.core import feature_space
+
+import config
 import generalization_experiment
+import prior_cache
+import results_store
+import sweep_executor
 
 
 """
@@ -34,386 +37,192 @@ The default values are CONFIG=exp.cfg and CORES=1.
 """
 
 
+# The groups of parameters that must take the same value at every level of
+# the hierarchy, when the learner is a child
+child_tied_params = [
+    [param + '-' + level for level in ['sup', 'basic', 'sub', 'instance']]
+    for param in ['gamma', 'k', 'p', 'decay', 'feature-weight']
+]
+
+
+def is_iterable(value):
+    return hasattr(value, '__iter__')
+
+
+def condition_axes(params):
+    """
+    Return the axes of the sweep over the list-valued parameters of params,
+    as a list of (parameter names, values) pairs; each value of an axis is
+    assigned to all of its parameter names.
+
+    The parameters that are constrained to be equal (see child_tied_params)
+    share one axis, with only the values common to all of them, so that the
+    combinations that violate a constraint are never generated.
+    """
+    tied_params = child_tied_params if params['learner-type'] == 'child' \
+        else []
+
+    axes = []
+    for names in tied_params:
+        values = [params[name] if is_iterable(params[name]) else
+                  [params[name]] for name in names]
+        common_values = [v for i, v in enumerate(values[0]) if
+                         v not in values[0][:i] and
+                         all(v in other_values for other_values in values[1:])]
+        axes.append((names, common_values))
+
+    tied = set(name for names in tied_params for name in names)
+    axes.extend(([p], params[p]) for p in params
+                if p not in tied and is_iterable(params[p]))
+
+    return axes
+
+
+def split_learner_types(params):
+    """
+    Return a list of a copy of params for each of its learner types, as the
+    constraints on the other parameters depend on the learner type.
+    """
+    if not is_iterable(params['learner-type']):
+        return [params]
+    paramlist = []
+    for learner_type in params['learner-type']:
+        par = params.copy()
+        par['learner-type'] = learner_type
+        paramlist.append(par)
+    return paramlist
+
+
 def generate_conditions(paramlist):
+    """
+    Generate the parameter settings of each experimental condition, in the
+    Cartesian product of the list-valued parameters of each params in
+    paramlist, which satisfy the constraints of its learner type.
+    """
+    if isinstance(paramlist, types.DictType):
+        paramlist = [paramlist]
+
+    for params in paramlist:
+        if ('experiment' in params and params['experiment'] == 'single'):
+            yield params  # only do one repetition of experiment
+            continue
+
+        for params in split_learner_types(params):
+            axes = condition_axes(params)
+            for il in itertools.product(*[values for _, values in axes]):
+                par = params.copy()  # keep the params having only one value
+                for (names, _), value in zip(axes, il):
+                    for name in names:
+                        par[name] = value
+                yield par
 
-    if isinstance(type(paramlist), types.DictType):
+
+def count_conditions(paramlist):
+    """
+    Return the number of experimental conditions of paramlist that satisfy
+    the constraints of their learner types, and the number before the
+    constraints are applied, without generating them.
+    """
+    if isinstance(paramlist, types.DictType):
         paramlist = [paramlist]
 
-    iparamlist = []
+    num_conditions = 0
+    num_unconstrained_conditions = 0
     for params in paramlist:
         if ('experiment' in params and params['experiment'] == 'single'):
-            iparamlist.append(params)  # only do one repetition of experiment
-        else:
-            iterparams = [p for p in params if hasattr(params[p], '__iter__')]
-            if len(iterparams) > 0:
-                iterfunc = itertools.product
-                for il in iterfunc(*[params[p] for p in iterparams]):
-                    par = params.copy()  # keep the params having only one value
-                    for i, ip in enumerate(iterparams):
-                        par[ip] = il[i]
-                    iparamlist.append(par)
-            else:
-                iparamlist.append(params)
-
-    return iparamlist
-
-
-def items_to_params(items):
-    params = {}
-    for t, v in items:
-        try:  # evaluating the parameter
-            params[t] = eval(v)
-            if isinstance(params[t], np.ndarray):
-                params[t] = params[t].tolist()
-        except (NameError, SyntaxError):
-            params[t] = v
-    return params
-
-
-def plot_results_as_bar_chart(results, savename=None,
-                              normalise_over_test_scene=True, annotation=None,
-                              y_limit=None):
-
-    #conditions = [
-    #    'one example',
-    #    'three subordinate examples',
-    #    'three basic-level examples',
-    #    'three superordinate examples'
-    #]
-    conditions = [
-        u'one example',
-        u'two subordinate examples',
-        u'two basic-level examples',
-        u'two superordinate examples',
-        u'three subordinate examples',
-        u'three basic-level examples',
-        u'three superordinate examples',
-        u'four subordinate examples',
-        u'four basic-level examples',
-        u'four superordinate examples',
-    ]
-
-    ind = np.array([2*n for n in range(len(results))])
-    width = 0.25
-
-    l0 = [np.mean(results[cond]['subordinate matches']) for cond in conditions]
-    l1 = [np.mean(results[cond]['basic-level matches']) for cond in conditions]
-    l2 = [np.mean(results[cond]['superordinate matches']) for cond in conditions]
-
-    error0 = [np.std(results[cond]['subordinate matches']) for cond in conditions]
-    error1 = [np.std(results[cond]['basic-level matches']) for cond in conditions]
-    error2 = [np.std(results[cond]['superordinate matches']) for cond in conditions]
-
-    if normalise_over_test_scene is True:
-
-        denom = [np.mean(results[cond]['subordinate matches']) for cond in conditions]
-
-        # If the following two lines are uncommented, then the results are normalized over the test scene
-        # If not, the results are scaled to the probability of the subordinate match
-        #denom = np.add(denom, [np.mean(results[cond]['basic-level matches']) for cond in conditions])
-        #denom = np.add(denom, [np.mean(results[cond]['superordinate matches']) for cond in conditions])
-
-        l0 = np.array(l0)
-        l1 = np.array(l1)
-        l2 = np.array(l2)
-
-        try:
-            l0 /= denom
-        except ZeroDivisionError:
-            pass
-        try:
-            l1 /= denom
-        except ZeroDivisionError:
-            pass
-        try:
-            l2 /= denom
-        except ZeroDivisionError:
-            pass
-
-        l0 = list(l0)
-        l1 = list(l1)
-        l2 = list(l2)
-
-        error0 = np.array(error0)
-        error1 = np.array(error1)
-        error2 = np.array(error2)
-
-        try:
-            error0 /= denom
-        except ZeroDivisionError:
-            pass
-        try:
-            error1 /= denom
-        except ZeroDivisionError:
-            pass
-        try:
-            error2 /= denom
-        except ZeroDivisionError:
-            pass
-
-        error0 = list(error0)
-        error1 = list(error1)
-        error2 = list(error2)
-
-    width = 0.5
-    fig = plt.figure()
-    ax = fig.add_subplot(111)
-    ax.bar(ind + width, l0, width, color='r', yerr=error0)
-    ax.bar(ind + 2*width, l1, width, color='g', yerr=error1)
-    ax.bar(ind + 3*width, l2, width, color='b', yerr=error2)
-
-    ax.set_ylabel("generalization probability")
-    ax.set_xlabel("training condition")
-
-    #short_form_conditions = [
-    #    '1 ex.',
-    #    '3 subord.',
-    #    '3 basic',
-    #    '3 super.'
-    #]
-    short_form_conditions = conditions[:]
-    short_form_conditions = [s.replace('example', 'ex') for s in short_form_conditions]
-    short_form_conditions = [s.replace('subordinate', 'subord') for s in short_form_conditions]
-    short_form_conditions = [s.replace('basic-level', 'basic') for s in short_form_conditions]
-    short_form_conditions = [s.replace('superordinate', 'super') for s in short_form_conditions]
-    ax.set_xticklabels([short_form_conditions[i//2] if (i+1) % 2 == 0 else '' \
-                        for i in range(2*len(short_form_conditions))])
-
-    m = np.max(l0 + l1 + l2)
-
-    if y_limit:
-        plt.ylim((0, y_limit))
-    elif normalise_over_test_scene is True:
-        plt.ylim((0, 1))
-    else:
-        plt.ylim((0, float(m)))
-
-    #lgd = plt.legend((p0, p1, p2), ('subord.', 'basic', 'super.'),
-                     #loc='upper right')
-
-    title = "Generalization scores"
-
-    if annotation is not None:
-        title += '\n' + annotation
-
-    if savename is None:
-        plt.show()
-    else:
-        #plt.savefig(savename, bbox_extra_artists=(lgd,), bbox_inches='tight')
-        plt.savefig(savename, bbox_inches='tight')
-
-    plt.close()
-
-
-def replace_with_underscores(s):
-    s = re.sub(r"[^\w\s-]", '', s)
-    s = re.sub(r"\s+", '_', s)
-    return s
+            num_conditions += 1
+            num_unconstrained_conditions += 1
+            continue
+
+        num_unconstrained_conditions += int(np.prod(
+            [len(params[p]) for p in params if is_iterable(params[p])]))
+        for params in split_learner_types(params):
+            num_conditions += int(np.prod(
+                [len(values) for _, values in condition_axes(params)]))
+
+    return num_conditions, num_unconstrained_conditions
+
+
+def is_valid_trial(params):
+    """Return whether params are valid for the learner type."""
+    return (not params['learner-type'] == 'child') or (params['learner-type'] ==
+                                                       'child' and
+                                                       check_for_child_params(params))
 
 
 def run_trial(params):
     """
     Conduct a trial of the novel word generalization experiment, under the
-    parameter settings specified in params.
+    parameter settings specified in params, and return its results (or None,
+    if params are not valid for the learner type).
     """
-    if (not params['learner-type'] == 'child') or (params['learner-type'] ==
-                                                   'child' and
-                                                   check_for_child_params(params)):
+    if is_valid_trial(params):
         experiment = generalization_experiment.Experiment(params)
         results = experiment.run()
 
-        # Create a title for the plots PNG image
-        title = ''
-        #title += ',' + 'featurespace_' + params['feature-space']
-        #title += ',' + 'alpha_' + str(params['alpha'])
-        #title += ',' + 'beta_' + str(params['beta'])
-        #title += ',' + 'gammasup_' + str(params['gamma-sup'])
-        #title += ',' + 'gammabas_' + str(params['gamma-basic'])
-        #title += ',' + 'gammasub_' + str(params['gamma-sub'])
-        #title += ',' + 'gammainst_' + str(params['gamma-instance'])
-        #title += ',' + 'k_' + str(params['k-sup'])
-        #title += ',' + 'kbas_' + str(params['k-basic'])
-        #title += ',' + 'ksub_' + str(params['k-sub'])
-        #title += ',' + 'kinst_' + str(params['k-instance'])
-        #title += ',' + 'psup_' + str(params['p-sup'])
-        #title += ',' + 'pbasic_' + str(params['p-basic'])
-        #title += ',' + 'psub_' + str(params['p-sub'])
-        #title += ',' + 'pinstance_' + str(params['p-instance'])
-        title += ',' + 'decaysup_' + str(params['decay-sup'])
-        title += ',' + 'decaybas_' + str(params['decay-basic'])
-        title += ',' + 'decaysub_' + str(params['decay-sub'])
-        title += ',' + 'decayinst_' + str(params['decay-instance'])
-        #title += ',' + 'fwsup_' + str(params['feature-weight-sup'])
-        #title += ',' + 'fwbasic_' + str(params['feature-weight-basic'])
-        #title += ',' + 'fwsub_' + str(params['feature-weight-sub'])
-        #title += ',' + 'fwinstance_' + str(params['feature-weight-instance'])
-        #title += ',' + 'subtractprior_' + str(params['subtract-prior'])
-        #title += ',' + 'metric_' + str(params['metric'])
-        title += ',' + 'spacing_' + params['spacing-condition']
-        title += ',' + 'test_' + "%03d" % params['test-delay']
-
-        title = title.lstrip(',')
-
-        if not os.path.exists(params['output-path']):
-            os.makedirs(params['output-path'])
-        if not os.path.exists(os.path.join(params['output-path'], 'plots')):
-            os.makedirs(os.path.join(params['output-path'], 'plots'))
-        if not os.path.exists(os.path.join(params['output-path'], 'csv')):
-            os.makedirs(os.path.join(params['output-path'], 'csv'))
-        if not os.path.exists(os.path.join(params['output-path'], 'sc')):
-            os.makedirs(os.path.join(params['output-path'], 'sc'))
-
-        if (not params['check-xt-condition'] and not\
-            params['check-spencer-condition'])\
-            or (params['check-xt-condition'] and xt_condition(results, params))\
-            or (params['check-spencer-condition'] and\
-                spencer_condition(results, params)):
-            plot_results_as_bar_chart(results,
-                                    savename=os.path.join(params['output-path'],
-                                                            'plots', title)+ '.png',
-                                    normalise_over_test_scene=True if
-                                      params['metric'] == 'intersection' else
-                                      True)
-            write_suspicious_coincidence(results,
-                                    savename=os.path.join(params['output-path'],
-                                                            'sc', title)+ '.dat')
-            write_results_as_csv_file(results,
-                                    savename=os.path.join(params['output-path'],
-                                                            'csv', title)+ '.dat')
+        return results
+
+
+def batch_trials(trials, batch_size):
+    """
+    Yield the trials of the iterable trials in batches (lists) of up to
+    batch_size trials, each of trials that differ only in their batched
+    parameters (see generalization_experiment.batched_params); a trial that
+    cannot be batched is yielded in a batch of its own.
+
+    A batch is yielded as soon as it is full, and the batches that are not
+    full at the end of trials are yielded last.
+    """
+    batches = collections.OrderedDict()
+    for params in trials:
+        if not generalization_experiment.is_batchable(params):
+            yield [params]
+            continue
+        key = generalization_experiment.batch_key(params)
+        batch = batches.setdefault(key, [])
+        batch.append(params)
+        if len(batch) >= batch_size:
+            yield batches.pop(key)
+
+    for batch in batches.values():
+        yield batch
+
+
+def run_batch(params_list):
+    """
+    Conduct the trials of the batch params_list (see batch_trials) in one
+    pass, and return a list of their results (with None for the trials whose
+    params are not valid for the learner type).
+    """
+    if len(params_list) == 1:
+        return [run_trial(params_list[0])]
+
+    valid = [params for params in params_list if is_valid_trial(params)]
+    if not valid:
+        return [None] * len(params_list)
+
+    results = iter(generalization_experiment.BatchedExperiment(valid).run())
+    return [next(results) if is_valid_trial(params) else None for params in
+            params_list]
+
+
+def trial_key(params):
+    """
+    Return the key of the trial with parameter settings params, which
+    identifies it in the results stores.
+    """
+    space = feature_space.load_feature_space(
+        generalization_experiment.feature_space_directory(params))
+    return results_store.trial_key(params, space.version)
 
 
 def check_for_child_params(params):
-    check_gamma = params['gamma-instance'] == params['gamma-sub'] and params['gamma-sub'] == params['gamma-basic'] and params['gamma-basic'] == params['gamma-sup']
-    check_k = params['k-instance'] == params['k-sub'] and params['k-sub'] == params['k-basic'] and params['k-basic'] == params['k-sup']
-    check_p = params['p-instance'] == params['p-sub'] and params['p-sub'] == params['p-basic'] and params['p-basic'] == params['p-sup']
-    check_decay = params['decay-instance'] == params['decay-sub'] and params['decay-sub'] == params['decay-basic'] and params['decay-basic'] == params['decay-sup']
-    check_feature_weight = params['feature-weight-instance'] == params['feature-weight-sub'] and params['feature-weight-sub'] == params['feature-weight-basic'] and params['feature-weight-basic'] == params['feature-weight-sup']
-    return check_gamma and check_k and check_p and check_decay and check_feature_weight
-
-def spencer_condition(results, params):
-    """Define the condition of having a reversal of the suspicious coincidence
-    effect, as in the Spencer et al. paper."""
-    normalisation = np.mean(results['one example']['subordinate matches']) + \
-        np.mean(results['one example']['basic-level matches']) + \
-        np.mean(results['one example']['superordinate matches'])
-    one_ex = np.mean(results['one example']['basic-level matches']) / normalisation
-
-    normalisation = np.mean(results['three subordinate examples']['subordinate matches']) + \
-        np.mean(results['three subordinate examples']['basic-level matches']) + \
-        np.mean(results['three subordinate examples']['superordinate matches'])
-    three_sub = np.mean(results['three subordinate examples']['basic-level matches']) / normalisation
-
-    one_ex_sub_basic_ratio =\
-        np.mean(results['one example']['subordinate matches']) /\
-        np.mean(results['one example']['basic-level matches'])
-
-    return is_close(three_sub / one_ex, 1.3) and one_ex_sub_basic_ratio > 2
-
-def xt_condition(results, params):
-    """Define bounds on acceptable results."""
-
-    # 1 ex.
-    sub = np.mean(results['one example']['subordinate matches'])
-    basic = np.mean(results['one example']['basic-level matches'])
-    sup = np.mean(results['one example']['superordinate matches'])
-
-    one_ex = is_close(basic/sub, params['one-ex-basic-sub-ratio']) and is_close(sup/sub, params['one-ex-sup-sub-ratio'])
-
-    # 3 subord.
-    sub = np.mean(results['three subordinate examples']['subordinate matches'])
-    basic = np.mean(results['three subordinate examples']['basic-level matches'])
-    sup = np.mean(results['three subordinate examples']['superordinate matches'])
-
-    three_subord = is_close(basic/sub, params['three-subord-basic-sub-ratio']) and is_close(sup/sub, params['three-subord-sup-sub-ratio'])
-
-    # 3 basic
-    sub = np.mean(results['three basic-level examples']['subordinate matches'])
-    basic = np.mean(results['three basic-level examples']['basic-level matches'])
-    sup = np.mean(results['three basic-level examples']['superordinate matches'])
-
-    three_basic = is_close(basic/sub, params['three-basic-basic-sub-ratio']) and is_close(sup/sub, params['three-basic-sup-sub-ratio'])
-
-    # 3 super.
-    sub = np.mean(results['three superordinate examples']['subordinate matches'])
-    basic = np.mean(results['three superordinate examples']['basic-level matches'])
-    sup = np.mean(results['three superordinate examples']['superordinate matches'])
-
-    three_super = is_close(basic/sub, params['three-super-basic-sub-ratio']) and is_close(sup/sub, params['three-super-sup-sub-ratio'])
-
-    return one_ex and three_subord and three_basic and three_super
-
-
-def is_close(x, y, atol=0.2, rtol=0):
-    return np.less_equal(abs(x-y), atol + rtol * y)
-
-
-def write_suspicious_coincidence(results, savename):
-    with open(savename, 'w') as f:
-        f.write(
-            str(
-            (np.mean(results['one example']['basic-level matches']) /\
-            np.mean(results['one example']['subordinate matches'])) /\
-            (np.mean(results['three subordinate examples']['basic-level matches']) /\
-            np.mean(results['three subordinate examples']['subordinate matches']))
-        ))
-
-def write_results_as_csv_file(results, savename):
-
-    conditions = [
-        'one example',
-        'three subordinate examples',
-        #'three basic-level examples',
-        #'three superordinate examples'
-    ]
-
-    conditions = [
-        'one example',
-        'two subordinate examples',
-        'two basic-level examples',
-        'two superordinate examples',
-        'three subordinate examples',
-        'three basic-level examples',
-        'three superordinate examples',
-        'four subordinate examples',
-        'four basic-level examples',
-        'four superordinate examples',
-    ]
-
-    abbrev_condition_names = {
-        'one example': '1 ex.',
-        'two subordinate examples': '2 subord.',
-        'two basic-level examples': '2 basic',
-        'two superordinate examples': '2 super.',
-        'three subordinate examples': '3 subord.',
-        'three basic-level examples': '3 basic',
-        'three superordinate examples': '3 super.',
-        'four subordinate examples': '4 subord.',
-        'four basic-level examples': '4 basic',
-        'four superordinate examples': '4 super.',
-    }
-
-    with open(savename, 'w') as f:
-        f.write("condition,sub. match,basic match,super. match\n")
-        for condition in conditions:
-
-            # TODO: choose appropriate normalisation
-            normalisation = \
-                np.mean(results[condition]['subordinate matches'])
-            #    np.mean(results[condition]['subordinate matches']) + \
-            #    np.mean(results[condition]['basic-level matches']) + \
-            #    np.mean(results[condition]['superordinate matches'])
-
-            f.write(abbrev_condition_names[condition])
-            f.write(',')
-            f.write(str(np.mean(results[condition]['subordinate matches'])/normalisation))
-            f.write(',')
-            f.write(str(np.mean(results[condition]['basic-level matches'])/normalisation))
-            f.write(',')
-            f.write(str(np.mean(results[condition]['superordinate matches'])/normalisation))
-            f.write("\n")
-
-
-def script(config_file, num_cores, **kwargs):
+    return all(params[name] == params[names[0]]
+               for names in child_tied_params for name in names[1:])
+
+
+def script(config_file, num_cores, chunk_size=1, max_tasks_per_child=None,
+           batch_size=1, prior_cache_path=None, **kwargs):
 
     # Parse the configuration file
     config_parser = ConfigParser()
@@ -423,24 +232,86 @@ def script(config_file, num_cores, **kwargs):
     # Generate the experimental conditions (by Cartesian product)
     paramlist = []
     for exp in config_parser.sections():
-        params = items_to_params(config_parser.items(exp))
+        params = config.items_to_params(config_parser.items(exp))
         params['name'] = exp
         paramlist.append(params)
 
-    # Randomise the order of experiment conditions
-    np.random.shuffle(paramlist)
+    num_conditions, num_unconstrained_conditions =\
+        count_conditions(paramlist)
+    logging.info("%d experimental conditions (%d of %d pruned by the learner "
+                 "constraints)", num_conditions,
+                 num_unconstrained_conditions - num_conditions,
+                 num_unconstrained_conditions)
+
+    # Keep the priors in a database, if one is given, so that each prior is
+    # computed once for all the processes of this sweep and later sweeps
+    if prior_cache_path is not None:
+        generalization_experiment.priors = \
+            prior_cache.PriorCache(prior_cache_path)
+
+    # The results store of each output path, and the keys of the trials in it
+    stores = {}
+    done_keys = {}
+
+    def is_done(params):
+        output_path = params['output-path']
+        if output_path not in stores:
+            if not os.path.exists(output_path):
+                os.makedirs(output_path)
+            stores[output_path] = results_store.ResultsStore(
+                results_store.results_path(output_path))
+            done_keys[output_path] = stores[output_path].trial_keys()
+        return trial_key(params) in done_keys[output_path]
+
+    try:
+        # Skip the trials that are already in the results stores, so that an
+        # interrupted sweep is resumed; the trials are run in the order in
+        # which they are generated
+        num_remaining = sum(1 for params in generate_conditions(paramlist)
+                            if not is_done(params))
+        logging.info("Running %d experimental conditions (%d already in the "
+                     "results stores)", num_remaining,
+                     num_conditions - num_remaining)
+
+        exp_list = (params for params in generate_conditions(paramlist)
+                    if not is_done(params))
+
+        # Batch the trials that differ only in their batched parameters, so
+        # that each batch is conducted by one batched learner
+        num_batches = num_remaining
+        if batch_size > 1:
+            num_batches = sum(1 for batch in batch_trials(
+                (params for params in generate_conditions(paramlist)
+                 if not is_done(params)), batch_size))
+            logging.info("Running the experimental conditions in %d batches "
+                         "of up to %d", num_batches, batch_size)
+
+        # Run the experiment(s), using the specified number of cores, and add
+        # the results of each trial to the results store of its output path,
+        # as the batches are completed
+        failed = []
+        for params_list, results_list, error in sweep_executor.run_trials(
+                run_batch, batch_trials(exp_list, batch_size),
+                num_cores=num_cores, chunk_size=chunk_size,
+                max_tasks_per_child=max_tasks_per_child,
+                total=num_batches):
+            if error is not None:
+                failed.extend(params_list)
+                continue
+            for params, results in zip(params_list, results_list):
+                if results is not None:
+                    stores[params['output-path']].append(
+                        params, results, key=trial_key(params))
+    finally:
+        for store in stores.values():
+            store.close()
+
+    if failed:
+        logging.error("%d of %d trials failed", len(failed), num_remaining)
 
-    exp_list = generate_conditions(paramlist)
-
-    # Run the experiment(s), using the specified number of cores
     if num_cores == 1:
-        for e in exp_list:
-            run_trial(e)
-
-    else:
-        pool = Pool(processes=num_cores)
-        pool.map(run_trial, exp_list)
-        pool.close()
+        logging.info("Prior cache: %d hits, %d read from disk, %d misses",
+                     *generalization_experiment.priors.statistics())
 
 
 def parse_args(args):
@@ -458,6 +329,31 @@ def parse_args(args):
                         type=int, default=1,
                         help='Number of processes used; default is 1')
 
+    parser.add_argument('--chunk_size', metavar='chunk_size', type=int,
+                        default=1,
+                        help='Number of trials given to a process at a time; '
+                             'default is 1')
+
+    parser.add_argument('--max_tasks_per_child', metavar='max_tasks_per_child',
+                        type=int, default=None,
+                        help='Number of chunks of trials after which a '
+                             'process is replaced; default is no limit')
+
+    parser.add_argument('--batch_size', metavar='batch_size', type=int,
+                        default=1,
+                        help='Number of trials that differ only in their '
+                             'gamma, k, p, decay and feature weight '
+                             'parameters conducted in one pass by a batched '
+                             'learner; only the trials with the default '
+                             'lexicon backend are batched; default is 1')
+
+    parser.add_argument('--prior_cache_path', metavar='prior_cache_path',
+                        type=str, default=None,
+                        help='The path of an SQLite database in which to '
+                             'keep the prior probabilities, shared by the '
+                             'processes of this and later sweeps; default is '
+                             'to keep them in memory, per process')
+
     parser.add_argument('--results_path', '-r', metavar='results_path',
                         type=str,
                         default=os.path.dirname(os.path.realpath(__file__)),
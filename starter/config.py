@@ -0,0 +1,25 @@
+from __future__ import print_function, division
+
+
+import numpy as np
+
+
+"""
+config.py
+
+The parsing of the parameter settings of the experiment config files, shared
+by conduct_generalization_experiments.py and render_results.py, so that
+neither stage depends on the other.
+"""
+
+
+def items_to_params(items):
+    params = {}
+    for t, v in items:
+        try:  # evaluating the parameter
+            params[t] = eval(v)
+            if isinstance(params[t], np.ndarray):
+                params[t] = params[t].tolist()
+        except (NameError, SyntaxError):
+            params[t] = v
+    return params
@@ -1,11 +1,16 @@
 from __future__ import print_function
-import json
+import collections
+import logging
 import numpy as np
 import os
 import pprint
 
+from novel_word_generalization.core import feature_space
 from novel_word_generalization.core import learn
 
+import prior_cache
+import training_plan
+
 
 """
 generalization_experiment.py
@@ -63,6 +68,45 @@ feature_to_feature_group_maps = {
 }
 
 
+# The levels of the hierarchy, as they are named in the parameters
+levels = ['sup', 'basic', 'sub', 'instance']
+
+# The parameters on which the training of a learner depends, in addition to
+# the gamma, k and p parameters (see Experiment.training_params)
+training_params = [
+    'word', 'alpha', 'beta', 'novelty', 'decay',
+    'decay-sup', 'decay-basic', 'decay-sub', 'decay-instance',
+    'feature-weight-sup', 'feature-weight-basic', 'feature-weight-sub',
+    'feature-weight-instance',
+    'spacing-condition', 'lexicon-backend',
+]
+
+# The parameters that may differ between the trials of a BatchedExperiment
+batched_params = ['%s-%s' % (name, level) for name in
+                  ['gamma', 'k', 'p', 'decay', 'feature-weight'] for level in
+                  levels]
+
+# The metrics that a BatchedExperiment can score
+batched_metrics = ['intersection', 'intersection-over-prototype',
+                   'cosine-without-test-distribution', 'hypothesis-space']
+
+# The trained learners of this process, keyed by training key (see
+# Experiment.training_key), in the order in which they were last used; at
+# most trained_learner_cache_size are kept
+trained_learner_cache_size = 256
+_trained_learners = collections.OrderedDict()
+
+# The priors of this process (see prior_cache); replaced by a PriorCache with
+# a database to share the priors between processes
+priors = prior_cache.PriorCache()
+
+
+def feature_space_directory(params):
+    """Return the directory of the feature space specified in params."""
+    return os.path.dirname(os.path.join(params['data-path'],
+                                        stimuli_files[params['feature-space']]))
+
+
 class InvalidParameterError(Exception):
     """
     Defines an exception that occurs when an invalid parameter value is
@@ -84,11 +128,17 @@ class Experiment(object):
 
     Members:
         params -- the  parameter settings for this Experiment
-        feature_group_to_level_map -- a dict of (feature group -> hieararchy
-        level)
-        feature_to_feature_group_map -- a dict of (feature -> feature group)
+        feature_group_to_level_map -- a dict of (feature group id ->
+        hieararchy level)
+        feature_to_feature_group_map -- a dict of (feature id -> feature group
+        id)
+        feature_space_version -- the version of the feature space
+        features -- a SymbolTable of the features
+        feature_groups -- a SymbolTable of the feature groups
         training_sets -- a dict of (training condition -> training set)
         test_sets -- a dict of (test condition -> test set)
+        unseen_object_features -- the scene of the unseen object
+        log_space -- whether the test trials are scored in the log domain
         unseen_prob -- the prior probability of the learner to generalize a
             novel word to an object, before seeing any evidence, under the
             parameter setting specified in params
@@ -111,29 +161,67 @@ class Experiment(object):
                                                 'xt-vehicles']:
             raise InvalidParameterError("undefined feature space")
 
-        # Access the data files (stimuli)
-        with open(os.path.join(self.params['data-path'],
-                               stimuli_files[self.params['feature-space']]),
-                  'r') as stimuli_file:
-            stimuli = json.load(stimuli_file)
-        self.training_sets = stimuli['training set']
-        self.test_sets = stimuli['test set']
-
-        # Access the information about the data that is assumed to belong to
-        # the learner
-        with open(os.path.join(self.params['data-path'],
-                               feature_group_to_level_maps[self.params['feature-space']]),
-                  'r') as feature_group_to_level_map:
-            self.feature_group_to_level_map =\
-                json.load(feature_group_to_level_map)
-        with open(os.path.join(self.params['data-path'],
-                               feature_to_feature_group_maps[self.params['feature-space']]),
-                  'r') as feature_to_feature_group_map:
-            self.feature_to_feature_group_map =\
-                json.load(feature_to_feature_group_map)
-
-        # Initialize the learner (for the unseen probability computation)
-        learner = learn.Learner(
+        # Load the feature space, with its features and feature groups
+        # interned as ids, for the learner; the feature space is loaded once
+        # per process, from its compiled form if it is present
+        space = feature_space.load_feature_space(
+            feature_space_directory(self.params))
+
+        self.feature_group_to_level_map =\
+            space.feature_group_to_level_map
+        self.feature_to_feature_group_map =\
+            space.feature_to_feature_group_map
+        self.feature_space_version = space.version
+        self.features = space.features
+        self.feature_groups = space.feature_groups
+
+        self.training_sets = space.training_sets
+        self.test_sets = space.test_sets
+        self.unseen_object_features = space.unseen_object_features
+
+        # Whether to score the test trials in the log domain
+        self.log_space = self.params.get('log-space', False)
+
+        # The prior (unseen) probability of an object, from the priors of
+        # this process if it has been computed before
+        if self.log_space:
+            self.log_unseen_prob = self.prior()
+            self.unseen_prob = np.exp(self.log_unseen_prob)
+        else:
+            self.unseen_prob = self.prior()
+
+    def compute_prior(self):
+        """
+        Return the prior (unseen) probability of an object -- its log, if
+        log_space -- computed by a new learner.
+        """
+        learner = self.new_learner()
+
+        if self.log_space:
+            return learner.generalization_probs([self.params['word']],
+                                                [self.unseen_object_features],
+                                                log=True)[..., 0, 0]
+        else:
+            return learner.generalization_prob(self.params['word'],
+                                               self.unseen_object_features)
+
+    def prior(self):
+        """
+        Return the prior (unseen) probability of an object -- its log, if
+        log_space -- memoized by prior key (see prior_cache.prior_key).
+        """
+        key = prior_cache.prior_key(self.params, self.feature_space_version)
+
+        prior = priors.get(key)
+        if prior is None:
+            prior = self.compute_prior()
+            priors.put(key, prior)
+
+        return prior
+
+    def new_learner(self):
+        """Return a new Learner, with the parameter settings of params."""
+        return learn.Learner(
             novelty=self.params['novelty'],
             decay=self.params['decay'],
             alpha=self.params['alpha'],
@@ -159,16 +247,158 @@ class Experiment(object):
             feature_weight_sub=self.params['feature-weight-sub'],
             feature_weight_instance=self.params['feature-weight-instance'],
             feature_group_to_level_map=self.feature_group_to_level_map,
-            feature_to_feature_group_map=self.feature_to_feature_group_map
+            feature_to_feature_group_map=self.feature_to_feature_group_map,
+            lexicon_backend=self.params.get('lexicon-backend', 'dict'),
         )
 
-        # Compute the prior (unseen) probability of an object
-        self.unseen_prob =\
-            learner.generalization_prob(self.params['word'],
-                                        stimuli['unseen object features'])
+    def training_params(self):
+        """
+        Return the names of the parameters on which the state of a learner
+        after the training trials depends.
+
+        The gamma, k and p parameters are used to compute the meaning
+        probabilities, from which the alignments are computed. As every
+        training trial is an utterance of a single word, with alpha = 0 and
+        no novelty every alignment is p / p = 1, whatever gamma, k and p
+        (> 0) are; the associations learned are then independent of these
+        parameters, and a trained learner can be reparameterized (see
+        learn.Learner.reparameterized) rather than trained again.
+        """
+        names = list(training_params)
+        if not (self.params['alpha'] == 0 and not self.params['novelty'] and
+                all(self.params['gamma-' + level] > 0 and
+                    self.params['k-' + level] > 0 for level in levels)):
+            names += ['%s-%s' % (name, level) for name in ['gamma', 'k', 'p']
+                      for level in levels]
+        return names
+
+    def training_key(self, training_condition):
+        """
+        Return the key of the state of a learner after the training trials of
+        training_condition, with the parameter settings of params.
+        """
+        return (self.feature_space_version, training_condition) + tuple(
+            (name, self.params.get(name)) for name in self.training_params())
+
+    def train_step(self, learner, scene):
+        """Perform the training trial of scene with learner."""
+        words = [self.params['word']]
+
+        learner.process_pair(words, scene, './',
+                             time_increment=(self.params['spacing-condition'] != 'simultaneous'))
+
+        #print("Meaning after training trial:")
+        #pprint.pprint(learner._learned_lexicon.meaning(self.params['word']))
+        #raw_input()
+        #print("")
+
+        if self.params['spacing-condition'].startswith('sequential'):
+            learner._time += int(self.params['spacing-condition'].split('-')[-1])
+
+    def training_schedules(self, training_conditions):
+        """
+        Return a dict of (training condition -> list of the scenes of its
+        training trials, in order), for each of training_conditions.
+        """
+        return dict((training_condition,
+                     [self.training_sets[training_condition][trial] for trial
+                      in self.training_sets[training_condition]])
+                    for training_condition in training_conditions)
+
+    def trained_learners(self):
+        """
+        Return a dict of (training condition -> Learner in the state of a
+        learner trained on the training trials of the training condition with
+        the parameter settings of params).
+
+        The trained learners are cached by training key (see training_key),
+        so that a sweep over the gamma, k and p parameters trains each
+        learner once when the training does not depend on them, and
+        reparameterizes the cached learner for every other trial. The
+        learners that are not cached are trained by a TrainingPlan, which
+        trains each prefix shared by their training schedules once; the
+        number of training trials it performs and saves are kept as
+        training_steps and saved_training_steps.
+        """
+        keys = dict((training_condition, self.training_key(training_condition))
+                    for training_condition in self.training_sets)
+
+        learners = {}
+        for training_condition, key in keys.items():
+            learner = _trained_learners.pop(key, None)
+            if learner is not None:
+                learners[training_condition] = learner
+
+        plan = training_plan.TrainingPlan(self.training_schedules(
+            [training_condition for training_condition in self.training_sets
+             if training_condition not in learners]))
+
+        learners.update(plan.train(self.new_learner(), self.train_step))
+
+        self.training_steps = plan.num_steps
+        self.saved_training_steps = plan.saved_steps()
+
+        for training_condition, key in keys.items():
+            _trained_learners[key] = learners[training_condition]
+        while len(_trained_learners) > trained_learner_cache_size:
+            _trained_learners.popitem(last=False)
+
+        gammas_ks_ps = [self.params['%s-%s' % (name, level)] for name in
+                        ['gamma', 'k', 'p'] for level in levels]
+        return dict((training_condition, learner.reparameterized(*gammas_ks_ps))
+                    for training_condition, learner in learners.items())
+
+    def compare_probs_to_prior(self, gen_probs):
+        """
+        Return the generalization probabilities gen_probs compared to the
+        prior (unseen) probability, as specified by the compare-to-prior
+        parameter.
+        """
+        if self.params['compare-to-prior'] == 'difference':
+            return gen_probs - self.unseen_prob
+
+        elif self.params['compare-to-prior'] == 'ratio':
+            return 1 - self.unseen_prob / gen_probs
+
+        elif self.params['compare-to-prior'] == None:
+            return gen_probs
+
+        else:
+            raise NotImplementedError
+
+    def compare_log_probs_to_prior(self, log_gen_probs):
+        """
+        Return the generalization probabilities, given by their logarithms
+        log_gen_probs, compared to the prior (unseen) probability, as
+        specified by the compare-to-prior parameter.
+        """
+        if self.params['compare-to-prior'] == 'difference':
+            return np.exp(log_gen_probs) - self.unseen_prob
+
+        elif self.params['compare-to-prior'] == 'ratio':
+            return -np.expm1(self.log_unseen_prob - log_gen_probs)
+
+        elif self.params['compare-to-prior'] == None:
+            return np.exp(log_gen_probs)
+
+        else:
+            raise NotImplementedError
 
     def run(self):
         """Conduct this Experiment and return the results."""
+        test_delay = self.params['test-delay']
+        return self.run_at_test_delays([test_delay])[test_delay]
+
+    def run_at_test_delays(self, test_delays):
+        """
+        Conduct this Experiment with each of test_delays as the test delay,
+        and return a dict of (test delay -> results).
+
+        The learner of each training condition is trained once, and tested at
+        all of test_delays in one batch (see
+        learn.Learner.generalization_probs), so that a forgetting curve
+        costs a single training run.
+        """
 
         print("Conducting an experimental trial, with parameters:")
         print("\t", "feature space  = ", self.params['feature-space'])
@@ -190,126 +420,266 @@ class Experiment(object):
         print("\t", "decay_sub  = ", self.params['decay-sub'])
         print("\t", "decay_instance  = ", self.params['decay-instance'])
 
-        results = {}
+        results = dict((test_delay, {}) for test_delay in test_delays)
+
+        cache_hits = 0
+        cache_misses = 0
+
+        # Train the learners, or reuse learners trained with the same
+        # training parameters
+        trained_learners = self.trained_learners()
 
         for training_condition in self.training_sets:
 
             print("\t\t", "Executing training condition:", training_condition,
                   "...")
 
-            results[training_condition] = {}
+            for test_delay in test_delays:
+                results[test_delay][training_condition] = {}
+
+            learner = trained_learners[training_condition]
+
+            # Manually increment the time for the simultaneous condition
+            learner._time += 1 if self.params['spacing-condition'] == 'simultaneous' else 0
+
+            # The test times, after each test delay
+            times = [learner._time + test_delay for test_delay in test_delays]
 
-            for test_condition in self.test_sets:
+            trained_learner = learner
+
+            for j, test_condition in enumerate(self.test_sets):
 
                 print("\t\t\t", "Testing", test_condition, "...")
 
-                # Initialize the learner
-                learner = learn.Learner(
-                    novelty=self.params['novelty'],
-                    decay=self.params['decay'],
-                    alpha=self.params['alpha'],
-                    beta=self.params['beta'],
-                    gamma_sup=self.params['gamma-sup'],
-                    gamma_basic=self.params['gamma-basic'],
-                    gamma_sub=self.params['gamma-sub'],
-                    gamma_instance=self.params['gamma-instance'],
-                    k_sup=self.params['k-sup'],
-                    k_basic=self.params['k-basic'],
-                    k_sub=self.params['k-sub'],
-                    k_instance=self.params['k-instance'],
-                    p_sup=self.params['p-sup'],
-                    p_basic=self.params['p-basic'],
-                    p_sub=self.params['p-sub'],
-                    p_instance=self.params['p-instance'],
-                    decay_sup=self.params['decay-sup'],
-                    decay_basic=self.params['decay-basic'],
-                    decay_sub=self.params['decay-sub'],
-                    decay_instance=self.params['decay-instance'],
-                    feature_weight_sup=self.params['feature-weight-sup'],
-                    feature_weight_basic=self.params['feature-weight-basic'],
-                    feature_weight_sub=self.params['feature-weight-sub'],
-                    feature_weight_instance=self.params['feature-weight-instance'],
-                    feature_group_to_level_map=self.feature_group_to_level_map,
-                    feature_to_feature_group_map=self.feature_to_feature_group_map,
-                )
-
-                #print("Initial meaning:")
+                # Test a fork of the trained learner, so that each test
+                # condition starts from the same trained state; the last test
+                # condition can use the trained learner itself
+                if j < len(self.test_sets) - 1:
+                    learner = trained_learner.fork()
+                else:
+                    learner = trained_learner
+
+                # Perform the test trials, in one batch
+                scenes = [self.test_sets[test_condition][test_object] for
+                          test_object in self.test_sets[test_condition]]
+
+                gen_probs_at_times = learner.generalization_probs(
+                    [self.params['word']],
+                    scenes,
+                    metric=self.params['metric'],
+                    test_condition=test_condition,
+                    log=self.log_space,
+                    times=times
+                )[..., 0, :]
+
+                if self.params['metric'] == 'intersection-over-prototype':
+                    scenes = [self.training_sets[training_condition][trial] for
+                              trial in self.training_sets[training_condition]]
+                    normalisers_at_times = learner.generalization_probs(
+                        [self.params['word']],
+                        scenes,
+                        metric=self.params['metric'],
+                        log=self.log_space,
+                        times=times
+                    )[..., 0, :]
+
+                for t, test_delay in enumerate(test_delays):
+
+                    gen_probs = gen_probs_at_times[t]
+
+                    if self.params['metric'] == 'intersection-over-prototype':
+                        normalisers = normalisers_at_times[t]
+
+                    if self.log_space:
+                        gen_probs = self.compare_log_probs_to_prior(gen_probs)
+
+                        if self.params['metric'] == 'intersection-over-prototype':
+                            # Mean of the probabilities, by log-sum-exp
+                            gen_probs /= np.exp(
+                                np.logaddexp.reduce(normalisers, axis=-1) -
+                                np.log(normalisers.shape[-1]))[..., np.newaxis]
+
+                    else:
+                        gen_probs = self.compare_probs_to_prior(gen_probs)
+
+                        if self.params['metric'] == 'intersection-over-prototype':
+                            gen_probs /= (sum(np.rollaxis(normalisers, -1)) /
+                                          normalisers.shape[-1])[..., np.newaxis]
+
+                    gen_probs = np.array(gen_probs, dtype=np.float64)
+                    results[test_delay][training_condition][test_condition] = \
+                        gen_probs
+
+                hits, misses = learner.cache_statistics()
+                cache_hits += hits
+                cache_misses += misses
+
+                #print("Meaning before test trials:")
+                #print(learner._time)
                 #pprint.pprint(learner._learned_lexicon.meaning(self.params['word']))
-                #raw_input()
 
-                # Perform the training trials
-                for i, trial in enumerate(self.training_sets[training_condition]):
+        logging.debug("Gamma/denominator cache: %d hits, %d misses",
+                      cache_hits, cache_misses)
+        logging.debug("Training trials: %d, %d saved by sharing training "
+                      "prefixes", self.training_steps,
+                      self.saved_training_steps)
+        logging.debug("Prior cache: %d hits, %d read from disk, %d misses",
+                      *priors.statistics())
+
+        return results
 
-                    words = [self.params['word']]
-                    scene = self.training_sets[training_condition][trial]
 
-                    learner.process_pair(words, scene, './',
-                                         time_increment=(self.params['spacing-condition'] != 'simultaneous'))
+class BatchedExperiment(Experiment):
+    """
+    An object that conducts a batch of novel word generalization experiment
+    trials, which differ only in their gamma, k, p, decay and feature weight
+    parameters (see batched_params), in one pass.
 
-                    #print("Meaning after training trial %d:" % (i + 1))
-                    #pprint.pprint(learner._learned_lexicon.meaning(self.params['word']))
-                    #raw_input()
-                    #print("")
+    The trials are conducted by a single Learner with the batched Lexicon,
+    whose meaning probabilities have a leading configuration axis, so that
+    each training and test trial is performed once for the whole batch.
 
-                    if self.params['spacing-condition'].startswith('sequential'):
-                        learner._time += int(self.params['spacing-condition'].split('-')[-1])
+    Members:
+        params_list -- the parameter settings of the trials of this
+            BatchedExperiment; params is the first of them
+    """
 
-                gen_probs = []
+    def __init__(self, params_list):
+        """Initialize this BatchedExperiment.
 
-                # Manually increment the time for the simultaneous condition
-                learner._time += 1 if self.params['spacing-condition'] == 'simultaneous' else 0
+        Initialize this BatchedExperiment according to the parameter
+        settings of each trial in params_list.
+        """
+        self.params_list = params_list
 
-                # Manually increment time for test delay
-                learner._time += self.params['test-delay']
+        for params in params_list:
+            if not is_batchable(params):
+                raise InvalidParameterError(
+                    "parameters not supported by a batched experiment")
+            if batch_key(params) != batch_key(params_list[0]):
+                raise InvalidParameterError(
+                    "parameters differ in more than the batched parameters")
 
-                # Perform the test trials
-                for test_object in self.test_sets[test_condition]:
+        Experiment.__init__(self, params_list[0])
 
-                    scene = self.test_sets[test_condition][test_object]
+        # The prior (unseen) probability of each trial, as a column
+        self.unseen_prob = self.unseen_prob[:, np.newaxis]
+        if self.log_space:
+            self.log_unseen_prob = self.log_unseen_prob[:, np.newaxis]
 
-                    gen_prob = learner.generalization_prob(
-                        self.params['word'],
-                        scene,
-                        metric=self.params['metric'],
-                        test_condition=test_condition
-                    )
+    def prior(self):
+        """
+        Return an array of the prior (unseen) probability of an object -- its
+        log, if log_space -- for each trial, memoized by prior key (see
+        prior_cache.prior_key); the priors that are not memoized are
+        computed by one batched learner.
+        """
+        keys = [prior_cache.prior_key(params, self.feature_space_version)
+                for params in self.params_list]
 
-                    if self.params['compare-to-prior'] == 'difference':
-                        gen_prob -= self.unseen_prob
+        found = {}
+        for key in keys:
+            if key not in found:
+                found[key] = priors.get(key)
 
-                    elif self.params['compare-to-prior'] == 'ratio':
-                        gen_prob = 1 - self.unseen_prob / gen_prob
+        if any(prior is None for prior in found.values()):
+            computed = self.compute_prior()
+            for i, key in enumerate(keys):
+                if found[key] is None:
+                    found[key] = computed[i]
+                    priors.put(key, computed[i])
 
-                    elif self.params['compare-to-prior'] == None:
-                        pass
+        return np.array([found[key] for key in keys], dtype=np.float64)
 
-                    else:
-                        raise NotImplementedError
+    def new_learner(self):
+        """
+        Return a new Learner, with the batched Lexicon, for the parameter
+        settings of params_list.
+        """
+        def batched(name):
+            return np.array([params[name] for params in self.params_list],
+                            dtype=float)
 
-                    if self.params['metric'] == 'intersection-over-prototype':
-                        normaliser = 0
-                        count = 0
-                        for trial in self.training_sets[training_condition]:
-                            scene = self.training_sets[training_condition][trial]
-                            normaliser += learner.generalization_prob(
-                                    self.params['word'],
-                                    scene,
-                                    metric=self.params['metric'],
-                                )
-                            count += 1
-                        normaliser /= count
-                        gen_prob /= normaliser
+        return learn.Learner(
+            novelty=self.params['novelty'],
+            decay=self.params['decay'],
+            alpha=self.params['alpha'],
+            beta=self.params['beta'],
+            gamma_sup=batched('gamma-sup'),
+            gamma_basic=batched('gamma-basic'),
+            gamma_sub=batched('gamma-sub'),
+            gamma_instance=batched('gamma-instance'),
+            k_sup=batched('k-sup'),
+            k_basic=batched('k-basic'),
+            k_sub=batched('k-sub'),
+            k_instance=batched('k-instance'),
+            p_sup=batched('p-sup'),
+            p_basic=batched('p-basic'),
+            p_sub=batched('p-sub'),
+            p_instance=batched('p-instance'),
+            decay_sup=batched('decay-sup'),
+            decay_basic=batched('decay-basic'),
+            decay_sub=batched('decay-sub'),
+            decay_instance=batched('decay-instance'),
+            feature_weight_sup=batched('feature-weight-sup'),
+            feature_weight_basic=batched('feature-weight-basic'),
+            feature_weight_sub=batched('feature-weight-sub'),
+            feature_weight_instance=batched('feature-weight-instance'),
+            feature_group_to_level_map=self.feature_group_to_level_map,
+            feature_to_feature_group_map=self.feature_to_feature_group_map,
+            lexicon_backend='batched',
+        )
+
+    def trained_learners(self):
+        """
+        Return a dict of (training condition -> Learner trained on the
+        training trials of the training condition, for every trial of this
+        BatchedExperiment), trained by a TrainingPlan.
+        """
+        plan = training_plan.TrainingPlan(
+            self.training_schedules(self.training_sets))
+        learners = dict(plan.train(self.new_learner(), self.train_step))
 
+        self.training_steps = plan.num_steps
+        self.saved_training_steps = plan.saved_steps()
 
+        return learners
 
+    def run(self):
+        """
+        Conduct this BatchedExperiment and return a list of the results of
+        each trial, in the order of params_list.
+        """
+        logging.debug("Conducting a batch of %d experimental trials",
+                      len(self.params_list))
 
-                    gen_probs.append(gen_prob)
+        results = Experiment.run(self)
 
-                gen_probs = np.array(gen_probs, dtype=np.float128)
-                results[training_condition][test_condition] = gen_probs
+        return [dict((training_condition,
+                      dict((test_condition, gen_probs[i]) for
+                           test_condition, gen_probs in
+                           results[training_condition].items()))
+                     for training_condition in results)
+                for i in range(len(self.params_list))]
 
-                #print("Meaning before test trials:")
-                #print(learner._time)
-                #pprint.pprint(learner._learned_lexicon.meaning(self.params['word']))
 
-        return results
+def is_batchable(params):
+    """
+    Return whether the trial with parameter settings params can be
+    conducted by a BatchedExperiment.
+
+    A BatchedExperiment uses the batched Lexicon, so that only the trials
+    with the default lexicon backend are batched; a trial that selects a
+    lexicon backend is conducted with that backend.
+    """
+    return params['metric'] in batched_metrics and not params['novelty'] \
+        and params.get('lexicon-backend', 'dict') == 'dict'
+
+
+def batch_key(params):
+    """
+    Return the key of the batch of trials with parameter settings params: the
+    parameter settings other than the batched parameters (and the name).
+    """
+    return tuple(sorted((name, repr(value)) for name, value in params.items()
+                        if name not in batched_params and name != 'name'))
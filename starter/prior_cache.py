@@ -0,0 +1,129 @@
+from __future__ import print_function, division
+
+
+import hashlib
+import json
+import numpy as np
+import os
+import sqlite3
+
+
+"""
+prior_cache.py
+
+A memo of the prior (unseen) probabilities of the novel word generalization
+experiment trials, shared by every Experiment of a process, and optionally
+kept in an SQLite database, so that it is shared by the processes of a
+sweep and by later sweeps.
+
+The prior is the probability of a learner that has seen no training trials
+to generalize a novel word to the unseen object. Every feature of the
+unseen object then has the meaning probability gamma / (k * gamma) (as the
+number of feature types aligned to the word is taken to be 1, p has no
+effect), so that the prior depends only on the feature space, the gamma and
+k parameters, and whether it is computed in the log domain; it does not
+depend on the decay, spacing or test delay of the trial.
+"""
+
+
+# The parameters on which the prior depends, other than the feature space
+prior_params = ['log-space'] + ['%s-%s' % (name, level) for name in
+                                ['gamma', 'k'] for level in
+                                ['sup', 'basic', 'sub', 'instance']]
+
+
+def prior_key(params, feature_space_version):
+    """
+    Return the key of the prior of the trial with parameter settings params,
+    on the feature space with version feature_space_version: the SHA-1 hash
+    of the parameters on which the prior depends.
+    """
+    dependencies = dict((name, float(params.get(name) or 0)) for name in
+                        prior_params)
+    dependencies['feature-space-version'] = feature_space_version
+    return unicode(hashlib.sha1(json.dumps(
+        dependencies, sort_keys=True, separators=(',', ':'))).hexdigest())
+
+
+class PriorCache(object):
+    """A memo of priors, keyed by prior key (see prior_key).
+
+    The priors are kept in memory, and, if path is not None, in an SQLite
+    database at path, which may be shared by several processes; each process
+    opens its own connection to the database, when it first uses it.
+
+    Members:
+        path -- the path of the SQLite database, or None
+        hits -- the number of priors found in memory
+        disk_hits -- the number of priors found in the database
+        misses -- the number of priors not found, which were computed
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._priors = {}
+        self._connection = None
+        self._pid = None
+
+    def connection(self):
+        """
+        Return the connection of this process to the database of this
+        PriorCache.
+        """
+        if self._pid != os.getpid():
+            # A connection must not be used by a forked process
+            self._connection = sqlite3.connect(self.path, timeout=60.0)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS priors "
+                "(prior_key TEXT PRIMARY KEY, prior REAL)")
+            self._connection.commit()
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, key):
+        """Return the prior with key key, or None if it is not memoized."""
+        try:
+            prior = self._priors[key]
+            self.hits += 1
+            return prior
+        except KeyError:
+            pass
+
+        if self.path is not None:
+            row = self.connection().execute(
+                "SELECT prior FROM priors WHERE prior_key = ?",
+                (key,)).fetchone()
+            if row is not None:
+                # A NaN prior (e.g., with gamma = 0) is stored as NULL
+                prior = np.float64(row[0] if row[0] is not None else np.nan)
+                self._priors[key] = prior
+                self.disk_hits += 1
+                return prior
+
+        self.misses += 1
+        return None
+
+    def put(self, key, prior):
+        """Memoize prior, with key key."""
+        prior = np.float64(prior)
+        self._priors[key] = prior
+
+        if self.path is not None:
+            with self.connection() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO priors VALUES (?, ?)",
+                    (key, float(prior)))
+
+    def statistics(self):
+        """
+        Return the (hits, disk hits, misses) of this PriorCache, in this
+        process.
+        """
+        return self.hits, self.disk_hits, self.misses
+
+    def __len__(self):
+        return len(self._priors)
@@ -0,0 +1,283 @@
+from __future__ import print_function, division
+
+
+import hashlib
+import json
+import numpy as np
+import numbers
+import os
+import sqlite3
+import time
+
+
+"""
+results_store.py
+
+A store of the results of the trials of the novel word generalization
+experiments, in one SQLite database per output path, in place of the
+per-trial files.
+
+The trials table has a row per trial, with its trial key (see trial_key) and
+a column per parameter; the
+gen_probs table has a row per (trial, training condition, test condition),
+with the generalization probabilities of the test objects as an array of
+float64s. The results are written by the parent process, in batches of
+trials per transaction, and can be selected by their parameter values.
+"""
+
+
+RESULTS_FILE = 'results.sqlite'
+
+# The parameters that do not affect the results of a trial
+non_effective_params = ['name', 'data-path', 'output-path']
+
+
+def results_path(output_path):
+    """Return the path of the results store in output_path."""
+    return os.path.join(output_path, RESULTS_FILE)
+
+
+def quote(name):
+    """Return the SQL identifier of the column of the parameter name."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def to_column_value(value):
+    """
+    Return the parameter value as a value of a SQLite column; non-scalar
+    values are stored as JSON.
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or isinstance(value, (basestring, numbers.Number)):
+        return value
+    return json.dumps(value)
+
+
+def canonical_value(value):
+    """
+    Return the parameter value in a canonical form, in which numbers that
+    are equal (e.g., 1 and 1.0) are the same.
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, numbers.Number) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (list, tuple)):
+        return [canonical_value(v) for v in value]
+    return value
+
+
+def trial_key(params, feature_space_version):
+    """
+    Return the key of the trial with parameter settings params, on the
+    feature space with version feature_space_version: the SHA-1 hash of its
+    effective parameters, in a canonical form.
+    """
+    effective_params = dict((name, canonical_value(value)) for name, value in
+                            params.items() if name not in non_effective_params)
+    effective_params['feature-space-version'] = feature_space_version
+    return unicode(hashlib.sha1(json.dumps(
+        effective_params, sort_keys=True, separators=(',', ':'))).hexdigest())
+
+
+class ResultsStore(object):
+    """A store of the parameters and results of experimental trials.
+
+    Members:
+        path -- the path of the SQLite database
+        batch_size -- the number of trials written per transaction
+        flush_interval -- the maximum time between writes, in s, so that few
+            trials are lost if the process is killed
+    """
+
+    def __init__(self, path, batch_size=100, flush_interval=10.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._last_flush = time.time()
+
+        # The store may be read by a thread other than the one that opened
+        # it (e.g., the thread that feeds the trials to a Pool), but is never
+        # used by two threads at once
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS trials "
+            "(trial_id INTEGER PRIMARY KEY, trial_key TEXT)")
+        if 'trial_key' not in [row[1] for row in self._connection.execute(
+                "PRAGMA table_info(trials)")]:
+            # A store written before the trials had keys
+            self._connection.execute(
+                "ALTER TABLE trials ADD COLUMN trial_key TEXT")
+        self._connection.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS trials_trial_key "
+            "ON trials (trial_key)")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS gen_probs "
+            "(trial_id INTEGER, training_condition TEXT, "
+            "test_condition TEXT, probs BLOB)")
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS gen_probs_trial_id "
+            "ON gen_probs (trial_id)")
+        self._connection.commit()
+
+        self._columns = self.param_names()
+        self._pending = []
+
+    def param_names(self):
+        """Return the names of the parameters in this ResultsStore."""
+        cursor = self._connection.execute("PRAGMA table_info(trials)")
+        return [row[1] for row in cursor
+                if row[1] not in ['trial_id', 'trial_key']]
+
+    def trial_keys(self):
+        """Return the set of the trial keys of the trials in this store."""
+        self.flush()
+        return set(row[0] for row in self._connection.execute(
+            "SELECT trial_key FROM trials WHERE trial_key IS NOT NULL"))
+
+    def append(self, params, results, key=None):
+        """
+        Add a trial with parameters params, trial key key, and results, a
+        dict of (training condition -> (test condition -> generalization
+        probabilities)).
+
+        The trial is written with the next batch of batch_size trials, or
+        after flush_interval s; a trial whose key is already in this store
+        replaces the stored trial.
+        """
+        self._pending.append((params, results, key))
+        if len(self._pending) >= self.batch_size or \
+                time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write the pending trials, in one transaction."""
+        self._last_flush = time.time()
+        if not self._pending:
+            return
+
+        with self._connection:
+            for params, results, key in self._pending:
+
+                if key is not None:
+                    self._connection.execute(
+                        "DELETE FROM gen_probs WHERE trial_id IN "
+                        "(SELECT trial_id FROM trials WHERE trial_key = ?)",
+                        (key,))
+                    self._connection.execute(
+                        "DELETE FROM trials WHERE trial_key = ?", (key,))
+
+                for name in sorted(params):
+                    if name not in self._columns:
+                        self._connection.execute(
+                            "ALTER TABLE trials ADD COLUMN " + quote(name))
+                        self._columns.append(name)
+
+                names = sorted(params)
+                cursor = self._connection.execute(
+                    "INSERT INTO trials (trial_key, %s) VALUES (?, %s)" % (
+                        ', '.join(quote(name) for name in names),
+                        ', '.join('?' for name in names)),
+                    [key] + [to_column_value(params[name]) for name in names])
+
+                self._connection.executemany(
+                    "INSERT INTO gen_probs VALUES (?, ?, ?, ?)",
+                    [(cursor.lastrowid, training_condition, test_condition,
+                      sqlite3.Binary(np.asarray(gen_probs, dtype='<f8')
+                                     .tostring()))
+                     for training_condition in results
+                     for test_condition, gen_probs in
+                     results[training_condition].items()])
+
+        self._pending = []
+
+    def create_index(self, *names):
+        """Index the trials by the parameters names, for faster selection."""
+        self.flush()
+        with self._connection:
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS %s ON trials (%s)" % (
+                    quote('trials_' + '_'.join(names)),
+                    ', '.join(quote(name) for name in names)))
+
+    def where(self, filters):
+        """
+        Return the SQL WHERE clause (or None, if no trial can match) and its
+        values, of the trials whose parameters match filters (see select).
+        """
+        conditions = []
+        values = []
+        for name, value in sorted(filters.items()):
+            name = name.replace('_', '-')
+            if name not in self._columns:
+                return None, []
+            if isinstance(value, (list, tuple)):
+                conditions.append("%s IN (%s)" % (
+                    quote(name), ', '.join('?' for v in value)))
+                values.extend(to_column_value(v) for v in value)
+            else:
+                conditions.append("%s IS ?" % quote(name))
+                values.append(to_column_value(value))
+
+        if not conditions:
+            return "", values
+        return " WHERE " + " AND ".join(conditions), values
+
+    def count(self, **filters):
+        """Return the number of trials whose parameters match filters."""
+        self.flush()
+        where, values = self.where(filters)
+        if where is None:
+            return 0
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM trials" + where, values).fetchone()[0]
+
+    def select(self, **filters):
+        """
+        Yield the (params, results) of each trial whose parameters match
+        filters, in the order the trials were added; params has every
+        parameter of this ResultsStore, with None for those the trial did not
+        have.
+
+        The parameter names are given with underscores for hyphens (e.g.,
+        gamma_sup=2); a filter value that is a list or tuple matches any of
+        its values.
+        """
+        self.flush()
+        where, values = self.where(filters)
+        if where is None:
+            return
+
+        trials = self._connection.execute(
+            "SELECT * FROM trials" + where + " ORDER BY trial_id", values)
+        names = [description[0] for description in trials.description]
+
+        for row in trials.fetchall():
+            params = dict((name, value) for name, value in zip(names, row)
+                          if name not in ['trial_id', 'trial_key'])
+
+            results = {}
+            for training_condition, test_condition, probs in \
+                    self._connection.execute(
+                        "SELECT training_condition, test_condition, probs "
+                        "FROM gen_probs WHERE trial_id = ?", (row[0],)):
+                results.setdefault(training_condition, {})[test_condition] =\
+                    np.frombuffer(probs, dtype='<f8')
+
+            yield params, results
+
+    def __len__(self):
+        self.flush()
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM trials").fetchone()[0]
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,233 @@
+from __future__ import print_function, division
+
+
+import datetime
+import itertools
+import logging
+import multiprocessing
+from multiprocessing.queues import SimpleQueue
+import signal
+import time
+import traceback
+
+
+"""
+sweep_executor.py
+
+Run the trials of a parameter sweep, in this process or in a pool of worker
+processes, and yield the result of each trial as soon as it is complete.
+
+The trials are fed to the workers lazily, so that the sweep is never held in
+memory; a trial that raises an exception, or whose worker dies, is reported
+as failed, and the rest of the sweep goes on.
+"""
+
+
+class SweepProgress(object):
+    """Report the progress, throughput and ETA of a sweep.
+
+    Members:
+        total -- the number of trials in the sweep, or None if unknown
+        report_interval -- the minimum time between progress reports, in s
+        done -- the number of trials done so far
+        failed -- the number of failed trials so far
+    """
+
+    def __init__(self, total=None, report_interval=10.0):
+        self.total = total
+        self.report_interval = report_interval
+        self.done = 0
+        self.failed = 0
+
+        self._start = time.time()
+        self._last_report = self._start
+
+    def update(self, failed=False):
+        """Record that one more trial is done, and report if it is due."""
+        self.done += 1
+        if failed:
+            self.failed += 1
+        self.report(force=self.done == self.total)
+
+    def rate(self):
+        """Return the number of trials done per second."""
+        return self.done / max(time.time() - self._start, 1e-9)
+
+    def report(self, force=False):
+        """Log the progress, if report_interval has passed since the last."""
+        now = time.time()
+        if not force and now - self._last_report < self.report_interval:
+            return
+        self._last_report = now
+
+        if self.total is None:
+            logging.info("%d trials done (%d failed), %.2f trials/s",
+                         self.done, self.failed, self.rate())
+        else:
+            rate = self.rate()
+            eta = (self.total - self.done) / rate if rate > 0 else 0
+            logging.info("%d of %d trials done (%d failed), %.2f trials/s, "
+                         "ETA %s", self.done, self.total, self.failed, rate,
+                         datetime.timedelta(seconds=int(eta)))
+
+
+def call_trial(func, params):
+    """
+    Return the (result, error) of func(params), where error is the traceback
+    of the exception raised by func, or None.
+    """
+    try:
+        return func(params), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+# The trial function of a worker process, and the queue to which it writes
+# the index of each trial it starts with its pid, set by init_worker; the
+# queue is written synchronously, so that the trial of a worker that dies is
+# still known
+_worker_func = None
+_worker_events = None
+
+
+def init_worker(func, events):
+    global _worker_func, _worker_events
+    _worker_func = func
+    _worker_events = events
+    # Leave interrupts to the parent process, which terminates the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def run_chunk(chunk):
+    """
+    Run the trials of chunk, a list of (index, params) pairs, in a worker
+    process, and return the (index, result, error) of each.
+    """
+    pid = multiprocessing.current_process().pid
+    results = []
+    for i, params in chunk:
+        _worker_events.put((pid, i))
+        result, error = call_trial(_worker_func, params)
+        results.append((i, result, error))
+    return results
+
+
+def run_trials(func, trials, num_cores=1, chunk_size=1,
+               max_tasks_per_child=None, total=None, report_interval=10.0,
+               poll_interval=1.0):
+    """
+    Run func on the params of each trial in the iterable trials, and yield the
+    (params, result, error) of each trial as it is completed, in the order of
+    completion; error is None, unless the trial failed.
+
+    If num_cores > 1, the trials are run by a pool of num_cores worker
+    processes, which get the trials in chunks of chunk_size, and are replaced
+    after max_tasks_per_child chunks (if not None). If a worker dies while
+    running a trial, that trial fails, and the pool is restarted with the
+    trials that were not completed (including the rest of its chunk).
+
+    The progress of the sweep is logged every report_interval s, with an ETA
+    if the number of trials, total, is given.
+    """
+    progress = SweepProgress(total, report_interval)
+
+    if num_cores == 1:
+        for params in trials:
+            result, error = call_trial(func, params)
+            if error is not None:
+                logging.error("Trial failed:\n%s", error)
+            progress.update(failed=error is not None)
+            yield params, result, error
+        return
+
+    trials = iter(trials)
+    indices = itertools.count()
+
+    # The trials given to the pool and not yet completed, by index
+    in_flight = {}
+
+    def feed(retried):
+        # The trials are chunked here rather than by the pool, whose chunked
+        # results cannot be waited for with a timeout
+        tasks = itertools.chain(
+            retried, ((next(indices), params) for params in trials))
+        while True:
+            chunk = list(itertools.islice(tasks, chunk_size))
+            if not chunk:
+                break
+            in_flight.update(chunk)
+            yield chunk
+
+    retried = []
+    while True:
+        events = SimpleQueue()
+        pool = multiprocessing.Pool(num_cores, init_worker, (func, events),
+                                    max_tasks_per_child)
+        results = pool.imap_unordered(run_chunk, feed(retried))
+
+        # The last trial started by each worker, by pid
+        running = {}
+        suspected = []
+        crashed = []
+
+        try:
+            while True:
+                try:
+                    chunk_results = results.next(timeout=poll_interval)
+
+                except StopIteration:
+                    break
+
+                except multiprocessing.TimeoutError:
+                    # Find the live workers before reading the events, so
+                    # that the last trial of every dead worker is known
+                    alive = set(p.pid for p in
+                                multiprocessing.active_children())
+                    while not events.empty():
+                        pid, i = events.get()
+                        running[pid] = i
+
+                    # The trials of the workers that are gone; as a worker
+                    # that is gone may have completed its chunk, a trial is
+                    # taken as crashed only if it is still not completed at
+                    # the next poll
+                    crashed = [(pid, running[pid]) for pid, i in suspected
+                               if running[pid] == i and i in in_flight]
+                    if crashed:
+                        break
+                    suspected = [(pid, i) for pid, i in running.items()
+                                 if pid not in alive and i in in_flight]
+                    progress.report()
+                    continue
+
+                for i, result, error in chunk_results:
+                    params = in_flight.pop(i)
+                    if error is not None:
+                        logging.error("Trial failed:\n%s", error)
+                    progress.update(failed=error is not None)
+                    yield params, result, error
+
+        except:
+            pool.terminate()
+            pool.join()
+            raise
+
+        if not crashed:
+            pool.close()
+            pool.join()
+            return
+
+        pool.terminate()
+        pool.join()
+
+        for pid, i in crashed:
+            params = in_flight.pop(i)
+            error = "worker process %d died" % pid
+            logging.error("Trial failed: %s", error)
+            progress.update(failed=True)
+            yield params, None, error
+
+        logging.warning("Restarting the pool, with %d unfinished trials",
+                        len(in_flight))
+        retried = sorted(in_flight.items())
+        in_flight.clear()
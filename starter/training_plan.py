@@ -0,0 +1,92 @@
+from __future__ import print_function, division
+
+
+import collections
+
+
+"""
+training_plan.py
+
+A planner of the training of a learner on the training schedules of a novel
+word generalization experiment trial.
+
+The training conditions of a feature space often share prefixes (e.g., the
+first example of 'two subordinate examples' is the example of 'one
+example'), and a learner trained on a schedule is in the same state after
+each of its prefixes as a learner trained on that prefix alone. The
+schedules are arranged in a prefix trie, so that each shared prefix is
+trained once, and the learner is forked where the schedules diverge.
+"""
+
+
+class TrainingPlan(object):
+    """A prefix trie of training schedules.
+
+    Members:
+        schedules -- a dict of (training condition -> list of the scenes of
+            its training trials, in order)
+        num_steps -- the number of training trials to train on every schedule
+            by this TrainingPlan
+        num_unshared_steps -- the number of training trials to train on every
+            schedule from scratch
+    """
+
+    def __init__(self, schedules):
+        self.schedules = schedules
+        self.num_steps = 0
+        self.num_unshared_steps = 0
+
+        # Each node of the trie is a (scene, training conditions, children)
+        # triple: the scene of the training trial leading to the node, the
+        # training conditions whose schedules end at the node, and a dict of
+        # (scene, as a tuple -> child node)
+        self._root = (None, [], collections.OrderedDict())
+
+        for training_condition in sorted(schedules):
+            node = self._root
+            for scene in schedules[training_condition]:
+                children = node[2]
+                key = tuple(scene)
+                if key not in children:
+                    children[key] = (scene, [], collections.OrderedDict())
+                    self.num_steps += 1
+                node = children[key]
+            node[1].append(training_condition)
+            self.num_unshared_steps += len(schedules[training_condition])
+
+    def saved_steps(self):
+        """
+        Return the number of training trials saved by this TrainingPlan,
+        compared to training on every schedule from scratch.
+        """
+        return self.num_unshared_steps - self.num_steps
+
+    def train(self, learner, step):
+        """
+        Yield a (training condition, trained learner) pair for each schedule
+        of this TrainingPlan, where the learner is trained by step(learner,
+        scene) on each scene of the schedule, starting from learner.
+
+        The learner is forked (see learn.Learner.fork) at each node of the
+        trie from which more than one schedule continues, so that no learner
+        that is yielded is trained further.
+        """
+        stack = [(self._root, learner)]
+
+        while stack:
+            (scene, training_conditions, children), learner = stack.pop()
+
+            for i, training_condition in enumerate(training_conditions):
+                if children or i < len(training_conditions) - 1:
+                    yield training_condition, learner.fork()
+                else:
+                    yield training_condition, learner
+
+            children = list(children.values())
+            for i, child in enumerate(children):
+                if i < len(children) - 1:
+                    child_learner = learner.fork()
+                else:
+                    child_learner = learner
+                step(child_learner, child[0])
+                stack.append((child, child_learner))
@@ -0,0 +1,65 @@
+from __future__ import division
+
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from novel_word_generalization.core import feature_space
+
+
+"""
+test_feature_space.py
+
+Tests of the loading of compiled feature spaces.
+"""
+
+
+data_path = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'data')
+
+
+class LoadFeatureSpaceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = os.path.join(tempfile.mkdtemp(), 'simple')
+        shutil.copytree(os.path.join(data_path, 'simple'), self.directory)
+        feature_space.compile_feature_space(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.directory))
+
+    def test_compiled(self):
+        space = feature_space.load_feature_space(self.directory)
+        self.assertEqual(space.version,
+                         feature_space.source_version(self.directory))
+
+    def test_stale_compiled(self):
+        feature_space.load_feature_space(self.directory)
+
+        # Edit a JSON file other than stimuli.json, and make the compiled
+        # form look newer than it
+        path = os.path.join(self.directory,
+                            feature_space.FEATURE_GROUP_TO_LEVEL_MAP_FILE)
+        with open(path) as f:
+            feature_group_to_level_map = json.load(f)
+        feature_group = sorted(feature_group_to_level_map)[0]
+        feature_group_to_level_map[feature_group] = 'instance'
+        with open(path, 'w') as f:
+            json.dump(feature_group_to_level_map, f)
+        compiled_path = os.path.join(self.directory,
+                                     feature_space.COMPILED_FILE)
+        os.utime(compiled_path, (os.path.getmtime(path) + 10,) * 2)
+
+        space = feature_space.load_feature_space(self.directory)
+        self.assertEqual(space.version,
+                         feature_space.source_version(self.directory))
+        self.assertEqual(
+            space.feature_group_to_level_map[
+                space.feature_groups.id(feature_group)], 'instance')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+from __future__ import division
+
+
+import unittest
+
+import numpy as np
+
+from novel_word_generalization.core import learn
+
+
+"""
+test_learn.py
+
+Tests of the generalization probabilities of learn.Learner.
+
+Run from the directory that contains the novel_word_generalization package:
+
+python -m unittest discover -s novel_word_generalization/tests -t .
+"""
+
+
+feature_group_to_level_map = {
+    'inst_group': 'instance',
+    'sup_group': 'superordinate',
+    'basic_group': 'basic-level',
+    'sub_group': 'subordinate',
+}
+
+feature_to_feature_group_map = {
+    'inst_a': 'inst_group', 'inst_b': 'inst_group',
+    'sup_a': 'sup_group', 'sup_b': 'sup_group',
+    'basic_a': 'basic_group', 'basic_b': 'basic_group',
+    'sub_a': 'sub_group', 'sub_b': 'sub_group',
+}
+
+
+def trained_learner(lexicon_backend):
+    """Return a Learner trained on two scenes of the word 'fep'."""
+    learner = learn.Learner(
+        alpha=0., beta=0.,
+        gamma_sup=0.5, gamma_basic=0.5, gamma_sub=0.5, gamma_instance=0.5,
+        k_sup=10., k_basic=10., k_sub=10., k_instance=10.,
+        p_sup=2., p_basic=2., p_sub=2., p_instance=2.,
+        decay_sup=0.5, decay_basic=0.5, decay_sub=0.5, decay_instance=0.5,
+        feature_weight_sup=1., feature_weight_basic=1., feature_weight_sub=1.,
+        feature_weight_instance=1.,
+        feature_group_to_level_map=feature_group_to_level_map,
+        feature_to_feature_group_map=feature_to_feature_group_map,
+        decay=True, lexicon_backend=lexicon_backend,
+    )
+    learner.process_pair(['fep'], ['inst_a', 'sup_a', 'basic_a', 'sub_a'],
+                         './')
+    learner.process_pair(['fep'], ['inst_a', 'sup_a', 'basic_a', 'sub_b'],
+                         './')
+    return learner
+
+
+class HypothesisSpaceTest(unittest.TestCase):
+
+    scenes = [['inst_a', 'sup_a', 'basic_a', 'sub_a'],
+              ['inst_b', 'sup_a', 'basic_b', 'sub_b']]
+
+    def subordinate_hypothesis(self, learner, scene):
+        """
+        Return the probability of the subordinate hypothesis of scene: the
+        product of the probabilities of its instance and subordinate
+        features.
+        """
+        gen_prob = 1.
+        for feature in scene:
+            if feature.startswith('inst') or feature.startswith('sub'):
+                gen_prob *= learner._learned_lexicon.prob(
+                    'fep', feature, learner._decay, learner._time)
+        return gen_prob
+
+    def test_unmatched_test_condition(self):
+        # A test condition that names no level is scored by the subordinate
+        # hypothesis alone
+        for lexicon_backend in ['dict', 'sparse']:
+            learner = trained_learner(lexicon_backend)
+            expected = [self.subordinate_hypothesis(learner, scene) for scene
+                        in self.scenes]
+
+            gen_probs = learner.generalization_probs(
+                ['fep'], self.scenes, metric='hypothesis-space',
+                test_condition='instance matches')
+            np.testing.assert_allclose(gen_probs[0], expected, rtol=1e-12)
+
+            log_gen_probs = learner.generalization_probs(
+                ['fep'], self.scenes, metric='hypothesis-space',
+                test_condition='instance matches', log=True)
+            np.testing.assert_allclose(log_gen_probs[0], np.log(expected),
+                                       rtol=1e-12)
+
+            self.assertAlmostEqual(
+                learner.generalization_prob(
+                    'fep', self.scenes[0], metric='hypothesis-space',
+                    test_condition='instance matches'),
+                expected[0], delta=1e-12 * expected[0])
+
+
+if __name__ == '__main__':
+    unittest.main()